@@ -0,0 +1,6 @@
+"""Microbenchmarks for the engine hot paths and the agents.
+
+    $ python -m benchmarks run                    # print results
+    $ python -m benchmarks run --save-baseline    # overwrite benchmarks/baseline.json
+    $ python -m benchmarks compare --threshold 0.2
+"""
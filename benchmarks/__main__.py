@@ -0,0 +1,50 @@
+import os
+import sys
+from argparse import ArgumentParser
+
+from benchmarks.runner import run_cases, compare, load_baseline, save_results, format_seconds
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def parse_arguments():
+    parser = ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("-k", "--filter", help="only run cases whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing loop")
+    parser.add_argument("--repeat", type=int, default=5, help="timing loops per case")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown ratio before flagging a regression")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    results = run_cases(args.filter, args.min_time, args.repeat, log=print)
+    if args.output:
+        save_results(args.output, results)
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print("\nBaseline written to %s" % args.baseline)
+    if args.command == "run":
+        return 0
+
+    rows = compare(results, load_baseline(args.baseline), args.threshold)
+    print("\n%-48s %11s %11s %7s" % ("case", "baseline", "current", "ratio"))
+    for row in rows:
+        if row["status"] == "missing":
+            print("%-48s %11s %s %7s not in baseline" % (row["name"], "-", format_seconds(row["current"]), "-"))
+            continue
+        print("%-48s %s %s %6.2fx %s" % (row["name"], format_seconds(row["baseline"]),
+            format_seconds(row["current"]), row["ratio"], "" if row["status"] == "ok" else row["status"]))
+    missing = [row for row in rows if row["status"] == "missing"]
+    if missing:
+        print("\n%d case(s) not in the baseline, rerun with --save-baseline to record them" % len(missing))
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print("\n%d regression(s) beyond %.0f%%" % (len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from pypokerengine.engine.card import Card
+from pypokerengine.engine.deck import Deck
+from pypokerengine.engine.table import Table
+from pypokerengine.engine.player import Player
+from pypokerengine.engine.hand_evaluator import HandEvaluator
+from pypokerengine.engine.data_encoder import DataEncoder
+from pypokerengine.engine.round_manager import RoundManager
+from pypokerengine.engine.message_builder import MessageBuilder
+from pypokerengine.utils.card_utils import estimate_hole_card_win_rate
+from pypokerengine.api.emulator import Emulator
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUBMISSION_DIR = os.path.join(REPO_ROOT, "submission")
+MCCFR_DIR = os.path.join(SUBMISSION_DIR, "sub", "mccfr")
+
+# name -> setup function. A setup function prepares its inputs and returns the
+# zero-argument callable that is timed.
+CASES = OrderedDict()
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+class SkipCase(Exception):
+    """Raised by a setup function when the case cannot run in this environment."""
+
+
+def _random_cards(num, rng):
+    return [Card.from_id(cid) for cid in rng.sample(range(1, 53), num)]
+
+def _heads_up_state():
+    random.seed(0)
+    table = Table()
+    for uuid in ["p0", "p1"]:
+        table.seats.sitdown(Player(uuid, 10000, uuid))
+    table.set_blind_pos(0, 1)
+    state, _ = RoundManager.start_new_round(1, 10, 0, table)
+    return state
+
+def _ask_message(state):
+    return MessageBuilder.build_ask_message(state["next_player"], state)["message"]
+
+def _submission_path():
+    for path in [REPO_ROOT, SUBMISSION_DIR, MCCFR_DIR]:
+        if path not in sys.path: sys.path.insert(0, path)
+
+
+@case("hand_evaluator.eval_hand")
+def bench_eval_hand():
+    rng = random.Random(0)
+    hands = [_random_cards(7, rng) for _ in range(256)]
+    hands = [(cards[:2], cards[2:]) for cards in hands]
+    def op():
+        for hole, community in hands:
+            HandEvaluator.eval_hand(hole, community)
+    op.unit = len(hands)
+    return op
+
+@case("hand_evaluator.eval_hand_from_ids")
+def bench_eval_hand_from_ids():
+    rng = random.Random(0)
+    hands = [rng.sample(range(1, 53), 7) for _ in range(256)]
+    hands = [(ids[:2], ids[2:]) for ids in hands]
+    def op():
+        for hole, community in hands:
+            HandEvaluator.eval_hand_from_ids(hole, community)
+    op.unit = len(hands)
+    return op
+
+@case("card.from_id_to_id")
+def bench_card_ids():
+    def op():
+        for cid in range(1, 53):
+            Card.from_id(cid).to_id()
+    op.unit = 52
+    return op
+
+@case("card.from_str")
+def bench_card_from_str():
+    strs = [str(Card.from_id(cid)) for cid in range(1, 53)]
+    def op():
+        for s in strs:
+            Card.from_str(s)
+    op.unit = len(strs)
+    return op
+
+@case("deck.shuffle_and_deal")
+def bench_deck():
+    def op():
+        deck = Deck()
+        deck.shuffle()
+        deck.draw_cards(4)
+        deck.draw_cards(5)
+    return op
+
+@case("deck.serialize_roundtrip")
+def bench_deck_serialize():
+    deck = Deck()
+    def op():
+        Deck.deserialize(deck.serialize())
+    return op
+
+@case("round_manager.apply_action")
+def bench_apply_action():
+    state = _heads_up_state()
+    def op():
+        RoundManager.apply_action(state, "call")
+    return op
+
+@case("data_encoder.encode_round_state")
+def bench_encode_round_state():
+    state = _heads_up_state()
+    def op():
+        DataEncoder.encode_round_state(state)
+    return op
+
+@case("emulator.run_rollout")
+def bench_run_rollout():
+    emulator = Emulator()
+    rollout_state = emulator.build_rollout_state(_heads_up_state())
+    rng = random.Random(0)
+    policy = lambda state, valid_actions: valid_actions[int(rng.random() * len(valid_actions))]
+    policies = { "p0": policy, "p1": policy }
+    def op():
+        emulator.run_rollout(rollout_state, policies, shuffle=True)
+    return op
+
+@case("card_utils.estimate_hole_card_win_rate[100]")
+def bench_win_rate():
+    hole = [Card.from_str(s) for s in ["SA", "HK"]]
+    community = [Card.from_str(s) for s in ["D2", "C7", "HT"]]
+    def op():
+        estimate_hole_card_win_rate(100, 2, hole, community)
+    return op
+
+# the timed iteration starts from the same table and random state every call, so its work
+# does not depend on how many calibration and timing loops ran before it
+MCCFR_WARMUP_ITERATIONS = 200
+
+def _copy_node_table(table):
+    copy = type(table)(num_actions=table.num_actions, capacity=len(table.regret_sum))
+    copy.index, copy.keys = dict(table.index), list(table.keys)
+    copy.regret_sum[:] = table.regret_sum
+    copy.strategy_sum[:] = table.strategy_sum
+    return copy
+
+@case("mccfr.training_iteration")
+def bench_mccfr_iteration():
+    _submission_path()
+    try:
+        from mccfr_trainer import MCCFRTrainer
+        from monte_carlo import GameState, PLAYER_COUNT
+    except ImportError as e:
+        raise SkipCase(str(e))
+    checkpoint_dir = tempfile.mkdtemp(prefix="bench_mccfr_")
+    try:
+        sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+        trainer = MCCFRTrainer(checkpoint_dir=checkpoint_dir)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    random.seed(0)
+    for _ in range(MCCFR_WARMUP_ITERATIONS):
+        for p_id in range(PLAYER_COUNT):
+            trainer.mccfr(GameState(), player_id=p_id, reach_probs=[1.0] * PLAYER_COUNT)
+    warm_table = trainer.node_table
+    def op():
+        trainer.node_table = _copy_node_table(warm_table)
+        random.seed(1)
+        for p_id in range(PLAYER_COUNT):
+            trainer.mccfr(GameState(), player_id=p_id, reach_probs=[1.0] * PLAYER_COUNT)
+    return op
+
+def _agent_case(name, build_agent):
+    @case("declare_action.%s" % name)
+    def bench_agent():
+        _submission_path()
+        try:
+            agent = build_agent()
+        except ImportError as e:
+            raise SkipCase(str(e))
+        agent.set_uuid("p%d" % _heads_up_state()["next_player"])
+        ask = _ask_message(_heads_up_state())
+        def op():
+            agent.declare_action(ask["valid_actions"], ask["hole_card"], ask["round_state"])
+        return op
+    return bench_agent
+
+def _random_player():
+    from randomplayer import RandomPlayer
+    return RandomPlayer()
+
+def _raised_player():
+    from raise_player import RaisedPlayer
+    return RaisedPlayer()
+
+def _q_learn_player():
+    from sub.q_learning.q_learning_agent import QLearnPlayer
+    return QLearnPlayer()
+
+def _abstraction_player():
+    from sub.abstraction_opponent_modeling.ouragent_modeling import OurPlayer
+    return OurPlayer()
+
+def _mccfr_player():
+    from sub.mccfr.mccfr_agent import MCCFRPlayer
+    return MCCFRPlayer()
+
+_agent_case("RandomPlayer", _random_player)
+_agent_case("RaisedPlayer", _raised_player)
+_agent_case("QLearnPlayer", _q_learn_player)
+_agent_case("OurPlayer", _abstraction_player)
+_agent_case("MCCFRPlayer", _mccfr_player)
+
@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import platform
+from time import perf_counter
+
+from benchmarks.cases import CASES, SkipCase
+
+def run_cases(pattern=None, min_time=0.2, repeat=5, log=None):
+    """Time every case whose name contains pattern.
+
+    Each case is called in a loop long enough to last min_time seconds, the
+    loop is repeated `repeat` times and the median / min time per operation is
+    kept. Cases that define `op.unit` report time per unit (e.g. per hand).
+    """
+    results = {}
+    for name, setup in CASES.items():
+        if pattern and pattern not in name: continue
+        try:
+            op = setup()
+        except SkipCase as e:
+            if log: log("%-48s skipped (%s)" % (name, e))
+            continue
+        results[name] = time_op(op, min_time, repeat)
+        if log: log("%-48s %s" % (name, format_seconds(results[name]["median"])))
+    return results
+
+def time_op(op, min_time, repeat):
+    number = _calibrate(op, min_time)
+    unit = getattr(op, "unit", 1)
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number): op()
+        samples.append((perf_counter() - start) / (number * unit))
+    samples.sort()
+    return {
+            "median": samples[len(samples) // 2],
+            "min": samples[0],
+            "number": number,
+            "repeat": repeat,
+            "unit": unit
+            }
+
+def compare(results, baseline, threshold):
+    """Return one row per current case with the current/baseline ratio.
+
+    Cases missing from the baseline get status "missing" (no baseline or ratio)
+    so that a stale baseline does not hide them.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            rows.append({ "name": name, "baseline": None, "current": result["median"], "ratio": None, "status": "missing" })
+            continue
+        base = baseline["results"][name]["median"]
+        ratio = result["median"] / base if base else float("inf")
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({ "name": name, "baseline": base, "current": result["median"], "ratio": ratio, "status": status })
+    return rows
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_results(path, results):
+    data = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "results": results
+            }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def format_seconds(seconds):
+    for unit, scale in [("s", 1.0), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale: return "%8.3f %s" % (seconds / scale, unit)
+    return "%8.3f ns" % (seconds / 1e-9)
+
+def _calibrate(op, min_time):
+    number = 1
+    while True:
+        start = perf_counter()
+        for _ in range(number): op()
+        elapsed = perf_counter() - start
+        if elapsed >= min_time / 10: break
+        number *= 10
+    return max(1, int(number * min_time / elapsed))
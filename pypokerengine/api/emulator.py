@@ -1,3 +1,6 @@
+import random
+from multiprocessing import Pool
+
 from pypokerengine.engine.table import Table
 from pypokerengine.engine.seats import Seats
 from pypokerengine.engine.card import Card
@@ -9,6 +12,7 @@ from pypokerengine.engine.poker_constants import PokerConstants as Const
 from pypokerengine.engine.round_manager import RoundManager
 from pypokerengine.engine.action_checker import ActionChecker
 from pypokerengine.engine.message_builder import MessageBuilder
+from pypokerengine.engine.rollout_state import RolloutState
 from pypokerengine.players import BasePokerPlayer
 from pypokerengine.utils.game_state_utils import deepcopy_game_state
 from pypokerengine.utils.timeout_decorator import timeout2
@@ -34,7 +38,7 @@ class Emulator(object):
             raise TypeError("player must inherit %s class." % BasePokerPlayer)
         
         # Wrap the function with a timeout
-        default_action_info      = ("fold",0)  # Fold
+        default_action_info      = "fold"
         player.declare_action = timeout2(0.5,default_action_info)(player.declare_action)
         
         self.players_holder[uuid] = player
@@ -60,12 +64,12 @@ class Emulator(object):
         players = game_state["table"].seats.players
         player_pos = game_state["next_player"]
         sb_amount = game_state["small_blind_amount"]
-        return ActionChecker.legal_actions(players, player_pos, sb_amount)
+        return ActionChecker.legal_actions(players, player_pos, sb_amount, game_state["street"])
 
-    def apply_action(self, game_state, action, bet_amount=0):
+    def apply_action(self, game_state, action):
         if game_state["street"] == Const.Street.FINISHED:
             game_state, events = self._start_next_round(game_state)
-        updated_state, messages = RoundManager.apply_action(game_state, action, bet_amount)
+        updated_state, messages = RoundManager.apply_action(game_state, action)
         events = [self.create_event(message[1]["message"]) for message in messages]
         events = [e for e in events if e]
         if self._is_last_round(updated_state, self.game_rule):
@@ -86,9 +90,9 @@ class Emulator(object):
             next_player_uuid = game_state["table"].seats.players[next_player_pos].uuid
             next_player_algorithm = self.fetch_player(next_player_uuid)
             msg = MessageBuilder.build_ask_message(next_player_pos, game_state)["message"]
-            action, amount = next_player_algorithm.declare_action(\
+            action = next_player_algorithm.declare_action(\
                     msg["valid_actions"], msg["hole_card"], msg["round_state"])
-            game_state, messages = RoundManager.apply_action(game_state, action, amount)
+            game_state, messages = RoundManager.apply_action(game_state, action)
             mailbox += messages
         events = [self.create_event(message[1]["message"]) for message in mailbox]
         events = [e for e in events if e]
@@ -96,6 +100,66 @@ class Emulator(object):
             events += self._generate_game_result_event(game_state)
         return game_state, events
 
+    def build_rollout_state(self, game_state):
+        """Compact copy of game_state for run_rollout.
+
+        Hole cards of every player still in the round have to be attached first
+        (e.g. with attach_hole_card_from_deck).
+        """
+        rollout_state = RolloutState.from_game_state(game_state)
+        missing = rollout_state.missing_hole_card_seats()
+        if missing:
+            raise ValueError(self.__missing_hole_card_msg % rollout_state.uuids[missing[0]])
+        return rollout_state
+
+    def run_rollout(self, rollout_state, policies, shuffle=False):
+        """Play the round of rollout_state to the end without building messages or events.
+
+        policies maps uuid -> callable(state, valid_actions) returning "fold", "call" or
+        "raise", where state is the RolloutState being played and valid_actions a tuple of
+        those action names. rollout_state is left untouched; the finished copy is returned
+        and its stacks hold the result. With shuffle=True the undealt cards are shuffled
+        first, so repeated calls sample different boards.
+        """
+        state = rollout_state.copy()
+        if shuffle: state.shuffle_deck()
+        return _play_rollout(state, [policies.get(uuid) for uuid in state.uuids])
+
+    def simulate_many(self, game_state, policies, n, workers=1, seed=None):
+        """Estimate the value of each legal action of the player to act in game_state.
+
+        Only the acting player's hole cards are taken from game_state. n worlds are
+        sampled by dealing the opponents' hole cards and the rest of the board from the
+        cards that player cannot see, and every legal action is played out on each world
+        (common random numbers) with policies as in run_rollout. The value of a rollout
+        is the acting player's final stack minus its current stack.
+
+        Returns { action: { "ev", "variance", "count" } } where variance is the sample
+        variance of a single rollout. With workers > 1 the worlds are split over a
+        process pool, so policies have to be picklable (module level functions).
+        """
+        if game_state["street"] == Const.Street.FINISHED:
+            raise ValueError("Cannot simulate a finished round")
+        rollout_state = RolloutState.from_game_state(game_state)
+        hero_pos = rollout_state.next_player
+        if len(rollout_state.hole_card[hero_pos]) != 2:
+            raise ValueError(self.__missing_hole_card_msg % rollout_state.uuids[hero_pos])
+        rng = random.Random(seed)
+        if workers == 1:
+            stats = [_simulate_worlds(rollout_state, policies, n, rng.getrandbits(32))]
+        else:
+            world_nums = [n // workers + (1 if i < n % workers else 0) for i in range(workers)]
+            tasks = [(rollout_state, policies, num, rng.getrandbits(32)) for num in world_nums if num != 0]
+            pool = Pool(workers, initializer=random.seed)
+            try:
+                stats = pool.starmap(_simulate_worlds, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        return _summarize_action_stats(stats)
+
+    __missing_hole_card_msg = "Player %s is still in the round but has no hole card"
+
     def run_until_game_finish(self, game_state):
         mailbox = []
         event_box= []
@@ -159,6 +223,43 @@ class Emulator(object):
         return [self.create_event(message)]
 
 
+def _play_rollout(state, seat_policies):
+    while state.street != Const.Street.FINISHED:
+        pos = state.next_player
+        state.apply_action(seat_policies[pos](state, state.legal_actions()))
+    return state
+
+def _simulate_worlds(rollout_state, policies, world_num, seed):
+    rng = random.Random(seed)
+    hero_pos = rollout_state.next_player
+    start_stack = rollout_state.stacks[hero_pos]
+    seat_policies = [policies.get(uuid) for uuid in rollout_state.uuids]
+    actions = rollout_state.legal_actions()
+    stats = { action: [0, 0, 0] for action in actions }  # count, sum, sum of squares
+    for _ in range(world_num):
+        world = rollout_state.copy()
+        world.determinize([hero_pos], rng)
+        for action in actions:
+            state = world.copy()
+            state.apply_action(action)
+            value = _play_rollout(state, seat_policies).stacks[hero_pos] - start_stack
+            stat = stats[action]
+            stat[0] += 1
+            stat[1] += value
+            stat[2] += value * value
+    return stats
+
+def _summarize_action_stats(stats_list):
+    summary = {}
+    for action in stats_list[0]:
+        count = sum([stats[action][0] for stats in stats_list])
+        total = sum([stats[action][1] for stats in stats_list])
+        squares = sum([stats[action][2] for stats in stats_list])
+        ev = 1.0 * total / count if count else 0.0
+        variance = (squares - total * ev) / (count - 1) if count > 1 else 0.0
+        summary[action] = { "ev": ev, "variance": variance, "count": count }
+    return summary
+
 def update_blind_level(ante, sb_amount, round_count, blind_structure):
     level_thresholds = sorted(blind_structure.keys())
     current_level_pos = [r <= round_count for r in level_thresholds].count(True)-1
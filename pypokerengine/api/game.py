@@ -1,20 +1,51 @@
 from pypokerengine.engine.dealer import Dealer
+from pypokerengine.engine.batch_scheduler import BatchScheduler
+from pypokerengine.engine.phase_profiler import PhaseProfiler
 from pypokerengine.players import BasePokerPlayer
 from pypokerengine.utils.timeout_decorator import timeout2
 
 def setup_config(max_round, initial_stack, small_blind_amount, ante=0):
     return Config(max_round, initial_stack, small_blind_amount, ante)
 
-def start_poker(config, verbose=2):
+def start_poker(config, verbose=2, profile=False, profile_output=None):
+    """Play one game. With profile=True the time spent in each engine phase is
+    measured and printed as a table, or written as JSON to profile_output."""
     config.validation()
+    dealer = _setup_dealer(config, verbose)
+    if not profile:
+        result_message = dealer.start_game(config.max_round)
+        return _format_result(result_message)
+    with PhaseProfiler() as profiler:
+        result_message = dealer.start_game(config.max_round)
+    if profile_output:
+        profiler.dump(profile_output)
+    else:
+        print(profiler.format_table())
+    return _format_result(result_message)
+
+def start_poker_batch(config, table_num, verbose=0):
+    """Play table_num games of the same config in lock-step.
+
+    Each registered algorithm is asked once per step with the pending decisions
+    of every table (see BasePokerPlayer.declare_actions_batch). Players keep the
+    same uuid on every table so a shared algorithm sees a consistent seat.
+    """
+    config.validation()
+    uuid_list = Dealer().uuid_list
+    dealers = [_setup_dealer(config, verbose, uuid_list[::]) for _ in range(table_num)]
+    result_messages = BatchScheduler(dealers).start_games(config.max_round)
+    return [_format_result(result_message) for result_message in result_messages]
+
+def _setup_dealer(config, verbose, uuid_list=None):
     dealer = Dealer(config.sb_amount, config.initial_stack, config.ante)
+    if uuid_list: dealer.uuid_list = uuid_list
     dealer.set_verbose(verbose)
     dealer.set_blind_structure(config.blind_structure)
+    dealer.set_recorder(config.recorder)
     for info in config.players_info:
         dealer.register_player(info["name"], info["algorithm"])
         # print(info["algorithm"].declare_action)
-    result_message = dealer.start_game(config.max_round)
-    return _format_result(result_message)
+    return dealer
 
 def _format_result(result_message):
     return {
@@ -27,6 +58,7 @@ class Config(object):
     def __init__(self, max_round, initial_stack, sb_amount, ante):
         self.players_info = []
         self.blind_structure = {}
+        self.recorder = None
         self.max_round = max_round
         self.initial_stack = initial_stack
         self.sb_amount = sb_amount
@@ -46,6 +78,9 @@ class Config(object):
     def set_blind_structure(self, blind_structure):
         self.blind_structure = blind_structure
 
+    def set_recorder(self, recorder):
+        self.recorder = recorder
+
     def validation(self):
         player_num = len(self.players_info)
         if player_num < 2:
@@ -0,0 +1,122 @@
+from collections import deque
+from multiprocessing import Pool
+
+from pypokerengine.engine.table import Table
+from pypokerengine.engine.deck import Deck
+from pypokerengine.engine.player import Player
+from pypokerengine.engine.round_manager import RoundManager
+from pypokerengine.engine.hand_history import HandHistoryReader
+from pypokerengine.engine.poker_constants import PokerConstants as Const
+
+DECISION_ACTIONS = ["FOLD", "CALL", "RAISE"]
+
+class Replayer(object):
+    """Replays a recorded hand history against agents and reports where their decisions differ.
+
+    Every recorded round is rebuilt with a cheat deck holding the recorded deal and is driven
+    through RoundManager with the recorded actions. At each decision of an evaluated seat the
+    ask message is handed to the agent's declare_action (no timeout wrapper) and its answer is
+    compared with the recorded action. The recorded action is always the one applied, so the
+    replay stays on the recorded path.
+
+    agent_factory is called once per evaluated seat (and once per worker process), so it has
+    to be picklable when processes > 1, e.g. an agent class.
+    """
+
+    def __init__(self, path, agent_factory, seats=None):
+        self.path = path
+        self.agent_factory = agent_factory
+        self.seats = seats
+
+    def replay(self, start=0, stop=None, processes=1, chunk_size=10000):
+        with HandHistoryReader(self.path) as reader:
+            stop = len(reader) if stop is None else min(stop, len(reader))
+        ranges = [(lo, min(lo + chunk_size, stop)) for lo in range(start, stop, chunk_size)]
+        if processes == 1:
+            reports = [self.replay_range(*r) for r in ranges]
+        else:
+            pool = Pool(processes)
+            try:
+                reports = pool.starmap(self.replay_range, ranges)
+            finally:
+                pool.close()
+                pool.join()
+        return _merge_reports(reports)
+
+    def replay_range(self, start, stop):
+        report = _empty_report()
+        with HandHistoryReader(self.path) as reader:
+            seats = self.seats if self.seats is not None else range(reader.seat_num)
+            agents = { seat: self.__setup_agent(seat) for seat in seats }
+            for idx in range(start, stop):
+                replay_hand(reader[idx], agents, report, hand_idx=idx)
+        return report
+
+    def __setup_agent(self, seat):
+        agent = self.agent_factory()
+        agent.set_uuid(seat_uuid(seat))
+        return agent
+
+
+def replay_hand(hand, agents, report, hand_idx=None):
+    table = build_table(hand)
+    state, msgs = RoundManager.start_new_round(
+            hand["round_count"], hand["small_blind_amount"], hand["ante"], table)
+    decisions = _decision_queues(hand)
+    while state["street"] != Const.Street.FINISHED:
+        seat, street = state["next_player"], state["street"]
+        queue = decisions.get((street, seat))
+        if not queue:
+            raise ValueError("Recorded hand %s diverged from the engine at street %d seat %d" % (hand_idx, street, seat))
+        recorded = queue.popleft()
+        if seat in agents:
+            ask = msgs[-1][1]["message"]
+            declared = agents[seat].declare_action(ask["valid_actions"], ask["hole_card"], ask["round_state"])
+            report["decisions"] += 1
+            if declared != recorded:
+                report["mismatches"].append({
+                    "hand": hand_idx,
+                    "round_count": hand["round_count"],
+                    "street": street,
+                    "seat": seat,
+                    "recorded": recorded,
+                    "declared": declared
+                    })
+        state, msgs = RoundManager.apply_action(state, recorded)
+    report["hands"] += 1
+    return report
+
+def build_table(hand):
+    card_ids = [cid for seat in hand["seats"] for cid in seat["hole_card"]] + hand["community_card"]
+    table = Table(cheat_deck=Deck(cheat=True, cheat_card_ids=card_ids))
+    table.dealer_btn = hand["dealer_btn"]
+    table.set_blind_pos(hand["small_blind_pos"], hand["big_blind_pos"])
+    for pos, seat in enumerate(hand["seats"]):
+        player = Player(seat_uuid(pos), seat["start_stack"], seat_uuid(pos))
+        if player.stack == 0: player.pay_info.update_to_fold()
+        table.seats.sitdown(player)
+    return table
+
+def seat_uuid(seat):
+    return "seat%d" % seat
+
+def _decision_queues(hand):
+    queues = {}
+    for action in hand["actions"]:
+        if action["action"] in DECISION_ACTIONS:
+            key = (action["street"], action["seat"])
+            queues.setdefault(key, deque()).append(action["action"].lower())
+    return queues
+
+def _empty_report():
+    return { "hands": 0, "decisions": 0, "mismatches": [] }
+
+def _merge_reports(reports):
+    merged = _empty_report()
+    for report in reports:
+        merged["hands"] += report["hands"]
+        merged["decisions"] += report["decisions"]
+        merged["mismatches"] += report["mismatches"]
+    merged["mismatch_rate"] = 1.0 * len(merged["mismatches"]) / merged["decisions"] if merged["decisions"] else 0.0
+    return merged
+
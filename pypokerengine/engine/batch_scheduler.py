@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+class BatchScheduler:
+  """Plays several tables in lock-step.
+
+  Every table is advanced to its next decision point, then each algorithm is
+  asked once for all of its pending decisions through respond_to_ask_batch.
+  The same algorithm instance may sit on every table, so it receives the
+  notifications of all tables interleaved.
+  """
+
+  def __init__(self, dealers):
+    self.dealers = dealers
+
+  def start_games(self, max_round):
+    games = [dealer.iter_game(max_round) for dealer in self.dealers]
+    results = [None for _ in games]
+    pending = OrderedDict()
+    for idx, game in enumerate(games):
+      self.__advance(idx, game, None, pending, results)
+    while len(pending) != 0:
+      for algorithm, entries in self.__group_by_algorithm(pending).values():
+        actions = algorithm.respond_to_ask_batch([msg["message"] for _, msg in entries])
+        if len(actions) != len(entries):
+          raise ValueError(self.__wrong_batch_size_msg % (len(entries), len(actions)))
+        for (idx, _), action in zip(entries, actions):
+          self.__advance(idx, games[idx], action, pending, results)
+    return results
+
+  def __advance(self, idx, game, action, pending, results):
+    try:
+      pending[idx] = game.send(action)
+    except StopIteration as e:
+      pending.pop(idx, None)
+      results[idx] = e.value
+
+  def __group_by_algorithm(self, pending):
+    batches = OrderedDict()
+    for idx, (address, msg) in pending.items():
+      algorithm = self.dealers[idx].message_handler.algo_owner_map[address]
+      batch = batches.setdefault(id(algorithm), (algorithm, []))
+      batch[1].append((idx, msg))
+    return batches
+
+  __wrong_batch_size_msg = "Asked for %d actions but received %d"
+
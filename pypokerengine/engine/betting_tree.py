@@ -0,0 +1,150 @@
+from pypokerengine.engine.player import Player
+from pypokerengine.engine.action_checker import ActionChecker
+from pypokerengine.engine.poker_constants import PokerConstants as Const
+
+class BettingTree:
+  """Every betting sequence of a heads-up fixed-limit round, indexed by dense node ids.
+
+  The tree follows the engine rules (ActionChecker / RoundManager): the small
+  blind acts first on every street, the big blind gets its preflop option, a
+  raise adds round_raise_amount and is legal while the agree amount is under
+  the street limit and the player raised less than 4 times on the previous
+  streets (current street raises do not count, as in ActionChecker). Stacks
+  are assumed deep enough that nobody is ever all-in.
+
+  Node 0 is the root (preflop, small blind to act). Per node arrays, indexed by
+  node id:
+    street        street of the decision or of the terminal
+    player        0 = small blind, 1 = big blind to act, -1 on terminals
+    terminal      NOT_TERMINAL, FOLD or SHOWDOWN
+    fold_player   player who folded on FOLD terminals, else -1
+    legal_actions action names in ActionChecker.legal_actions order
+    pot           chips in the pot, in small blind units
+    contribution  (small blind, big blind) chips put in, in small blind units
+    children      child node id per Const.Action.FOLD / CALL / RAISE, -1 if illegal
+    history       action initials leading to the node, streets split by "/" (e.g. "rc/cr")
+  """
+
+  NOT_TERMINAL = 0
+  FOLD = 1
+  SHOWDOWN = 2
+
+  ACTIONS = ["fold", "call", "raise"]
+
+  def __init__(self):
+    self.street = []
+    self.player = []
+    self.terminal = []
+    self.fold_player = []
+    self.legal_actions = []
+    self.pot = []
+    self.contribution = []
+    self.children = []
+    self.history = []
+    self.__build()
+
+  def __len__(self):
+    return len(self.street)
+
+  def child(self, node, action):
+    child = self.children[node][self.ACTIONS.index(action)]
+    if child == -1:
+      raise ValueError(self.__illegal_action_msg % (action, node))
+    return child
+
+  def node_from_actions(self, actions, node=0):
+    for action in actions:
+      node = self.child(node, action)
+    return node
+
+  def node_from_round_state(self, round_state):
+    """Node reached by the action_histories of a heads-up round_state."""
+    if len(round_state["seats"]) != 2:
+      raise ValueError("BettingTree only covers heads-up rounds")
+    actions = []
+    for street in self.__street_names:
+      for history in round_state["action_histories"].get(street, []):
+        if history["action"] in self.__decision_actions:
+          actions.append(history["action"].lower())
+    return self.node_from_actions(actions)
+
+  def is_terminal(self, node):
+    return self.terminal[node] != self.NOT_TERMINAL
+
+  def __build(self):
+    # paid, acted, prior_raises, street_raises, contribution are (small blind, big blind) pairs
+    root = {
+        "street": Const.Street.PREFLOP, "player": 0, "paid": (1, 2), "agree": 2,
+        "acted": (True, True), "bb_option": True, "prior_raises": (0, 0),
+        "street_raises": (0, 0), "contribution": (1, 2), "history": ""
+    }
+    self.__add_node(root)
+    stack = [(0, root)]
+    while stack:
+      node, state = stack.pop()
+      children = [-1, -1, -1]
+      for action in self.legal_actions[node]:
+        child_state = self.__apply(state, action)
+        children[self.ACTIONS.index(action)] = self.__add_node(child_state)
+        if child_state.get("terminal", self.NOT_TERMINAL) == self.NOT_TERMINAL:
+          stack.append((children[self.ACTIONS.index(action)], child_state))
+      self.children[node] = children
+
+  def __add_node(self, state):
+    terminal = state.get("terminal", self.NOT_TERMINAL)
+    self.street.append(state["street"])
+    self.player.append(state["player"] if terminal == self.NOT_TERMINAL else -1)
+    self.terminal.append(terminal)
+    self.fold_player.append(state.get("fold_player", -1))
+    self.legal_actions.append(self.__legal_actions(state) if terminal == self.NOT_TERMINAL else [])
+    self.pot.append(sum(state["contribution"]))
+    self.contribution.append(state["contribution"])
+    self.children.append([-1, -1, -1])
+    self.history.append(state["history"])
+    return len(self.street) - 1
+
+  def __legal_actions(self, state):
+    raise_amount, raise_limit = ActionChecker.round_raise_amount(1, state["street"])
+    if state["agree"] < raise_limit and state["prior_raises"][state["player"]] < 4:
+      return ["fold", "call", "raise"]
+    return ["fold", "call"]
+
+  def __apply(self, state, action):
+    player = state["player"]
+    state = dict(state, history=state["history"] + action[0])
+    if action == "fold":
+      state.update(terminal=self.FOLD, fold_player=player)
+      return state
+    amount = state["agree"]
+    if action == "raise":
+      amount += ActionChecker.round_raise_amount(1, state["street"])[0]
+      state["street_raises"] = self.__with(state["street_raises"], player, state["street_raises"][player] + 1)
+    added = amount - state["paid"][player]
+    state["contribution"] = self.__with(state["contribution"], player, state["contribution"][player] + added)
+    state["paid"] = self.__with(state["paid"], player, amount)
+    state["acted"] = self.__with(state["acted"], player, True)
+    state["agree"] = amount
+    if player == 1: state["bb_option"] = False
+    if not self.__is_everyone_agreed(state):
+      state["player"] = 1 - player
+      return state
+    if state["street"] == Const.Street.RIVER:
+      state["terminal"] = self.SHOWDOWN
+      return state
+    state.update(
+        street=state["street"] + 1, player=0, paid=(0, 0), agree=0, acted=(False, False),
+        bb_option=False, street_raises=(0, 0), history=state["history"] + "/",
+        prior_raises=tuple([p + s for p, s in zip(state["prior_raises"], state["street_raises"])]))
+    return state
+
+  def __is_everyone_agreed(self, state):
+    max_pay = max(state["paid"])
+    bb_option = (False, state["bb_option"])
+    return all([state["acted"][p] and not bb_option[p] and state["paid"][p] == max_pay for p in range(2)])
+
+  def __with(self, pair, idx, value):
+    return (value, pair[1]) if idx == 0 else (pair[0], value)
+
+  __street_names = ["preflop", "flop", "turn", "river"]
+  __decision_actions = [Player.ACTION_FOLD_STR, Player.ACTION_CALL_STR, Player.ACTION_RAISE_STR]
+  __illegal_action_msg = "%s is not legal at node %d"
@@ -18,6 +18,7 @@ class Dealer:
     self.message_summarizer = MessageSummarizer(verbose=0)
     self.table = Table()
     self.blind_structure = {}
+    self.recorder = None
 
   def register_player(self, player_name, algorithm):
     self.__config_check()
@@ -28,7 +29,19 @@ class Dealer:
   def set_verbose(self, verbose):
       self.message_summarizer.verbose = verbose
 
+  def set_recorder(self, recorder):
+    self.recorder = recorder
+
   def start_game(self, max_round):
+    return self.__drive(self.iter_game(max_round))
+
+  def iter_game(self, max_round):
+    """Generator version of start_game.
+
+    Yields (address, ask_message) every time a player has to declare an action
+    and expects the declared action to be sent back. Returns the game result
+    message when the game is finished.
+    """
     table = self.table
     self.__notify_game_start(max_round)
     ante, sb_amount = self.ante, self.small_blind_amount
@@ -36,24 +49,29 @@ class Dealer:
       ante, sb_amount = self.__update_forced_bet_amount(ante, sb_amount, round_count, self.blind_structure)
       table = self.__exclude_short_of_money_players(table, ante, sb_amount)
       if self.__is_game_finished(table): break
-      table = self.play_round(round_count, sb_amount, ante, table)
+      table = yield from self.iter_round(round_count, sb_amount, ante, table)
       table.shift_dealer_btn()
+    if self.recorder: self.recorder.flush()
     return self.__generate_game_result(max_round, table.seats)
-  
+
   def play_round(self, round_count, blind_amount, ante, table):
+    return self.__drive(self.iter_round(round_count, blind_amount, ante, table))
+
+  def iter_round(self, round_count, blind_amount, ante, table):
     state, msgs = RoundManager.start_new_round(round_count, blind_amount, ante, table)
+    start_state = state
     while True:
       #TODO:update the play_round
       self.__message_check(msgs, state["street"])
       if state["street"] != Const.Street.FINISHED:  # continue the round
-        action = self.__publish_messages(msgs)
+        action = yield self.__publish_notifications(msgs)
         state, msgs = RoundManager.apply_action(state, action)
       else:  # finish the round after publish round result
         self.__publish_messages(msgs)
+        if self.recorder: self.recorder.record_round(start_state, msgs[-1][1]["message"])
         break
     return state["table"]
 
-
   def set_small_blind_amount(self, amount):
     self.small_blind_amount = amount
 
@@ -98,10 +116,21 @@ class Dealer:
       raise Exception("Last message is not ask type. : %s" % msgs)
 
   def __publish_messages(self, msgs):
+    return self.message_handler.process_message(*self.__publish_notifications(msgs))
+
+  def __publish_notifications(self, msgs):
     for address, msg in msgs[:-1]:
       self.message_handler.process_message(address, msg)
     self.message_summarizer.summarize_messages(msgs)
-    return self.message_handler.process_message(*msgs[-1])
+    return msgs[-1]
+
+  def __drive(self, steps):
+    try:
+      ask = next(steps)
+      while True:
+        ask = steps.send(self.message_handler.process_message(*ask))
+    except StopIteration as e:
+      return e.value
 
   def __exclude_short_of_money_players(self, table, ante, sb_amount):
     sb_pos, bb_pos = self.__steal_money_from_poor_player(table, ante, sb_amount)
@@ -54,6 +54,56 @@ class HandEvaluator:
     hand_flg = self.__calc_hand_info_flg(hole, community) << 8
     return hand_flg | hole_flg
 
+  @classmethod
+  def eval_hand_from_ids(self, hole_ids, community_ids):
+    """Same value as eval_hand for cards given as Card.to_id() ids.
+
+    Ranks are folded into bit masks (one per multiplicity and one per suit) so
+    every category is found with a few mask operations instead of sorting and
+    grouping Card objects. Quirks of eval_hand are kept: no wheel straight,
+    high card compares the hole cards only.
+    """
+    r0, r1 = _ID_RANK[hole_ids[0]], _ID_RANK[hole_ids[1]]
+    hole_flg = r0 << 4 | r1 if r0 > r1 else r1 << 4 | r0
+    m1 = m2 = m3 = m4 = 0  # ranks held at least once, twice, ...
+    suit_masks, suit_counts = [0, 0, 0, 0], [0, 0, 0, 0]
+    for cards in (hole_ids, community_ids):
+      for cid in cards:
+        bit = _ID_RANK_BIT[cid]
+        if m3 & bit: m4 |= bit
+        elif m2 & bit: m3 |= bit
+        elif m1 & bit: m2 |= bit
+        else: m1 |= bit
+        suit = _ID_SUIT[cid]
+        suit_masks[suit] |= bit
+        suit_counts[suit] += 1
+    hand_flg = self.__calc_hand_info_flg_from_masks(m1, m2, m3, m4, suit_masks, suit_counts)
+    return (hand_flg if hand_flg is not None else hole_flg) << 8 | hole_flg
+
+  @classmethod
+  def __calc_hand_info_flg_from_masks(self, m1, m2, m3, m4, suit_masks, suit_counts):
+    flash_mask, flash_rank = 0, -1
+    for suit in range(4):
+      if suit_counts[suit] >= 5:
+        flash_mask = suit_masks[suit]
+        flash_rank = max(flash_rank, flash_mask.bit_length() - 1)
+    straight = flash_mask & flash_mask >> 1 & flash_mask >> 2 & flash_mask >> 3 & flash_mask >> 4
+    if straight: return self.STRAIGHTFLASH | (straight.bit_length() - 1) << 4
+    if m4: return self.FOURCARD | ((m4 & -m4).bit_length() - 1) << 4
+    if m3:
+      pairs = m2 & ~m3
+      if bin(m3).count("1") == 2: pairs |= m3 & -m3
+      if pairs: return self.FULLHOUSE | (m3.bit_length() - 1) << 4 | (pairs.bit_length() - 1)
+    if flash_rank != -1: return self.FLASH | flash_rank << 4
+    straight = m1 & m1 >> 1 & m1 >> 2 & m1 >> 3 & m1 >> 4
+    if straight: return self.STRAIGHT | (straight.bit_length() - 1) << 4
+    if m3: return self.THREECARD | (m3.bit_length() - 1) << 4
+    if m2 & (m2 - 1):
+      high = m2.bit_length() - 1
+      return self.TWOPAIR | high << 4 | ((m2 ^ 1 << high).bit_length() - 1)
+    if m2: return self.ONEPAIR | (m2.bit_length() - 1) << 4
+    return None
+
   # Return Format
   # [Bit flg of hand][rank1(4bit)][rank2(4bit)]
   # ex.)
@@ -258,3 +308,8 @@ class HandEvaluator:
     mask = 15
     return bit & mask
 
+
+# Card.to_id() -> rank (ace = 14), rank bit and suit index, for eval_hand_from_ids
+_ID_RANK = [0] + [14 if (cid - 1) % 13 == 0 else (cid - 1) % 13 + 1 for cid in range(1, 53)]
+_ID_RANK_BIT = [1 << rank for rank in _ID_RANK]
+_ID_SUIT = [0] + [(cid - 1) // 13 for cid in range(1, 53)]
@@ -0,0 +1,241 @@
+import os
+import mmap
+import struct
+
+from pypokerengine.engine.card import Card
+from pypokerengine.engine.pay_info import PayInfo
+from pypokerengine.engine.data_encoder import DataEncoder
+from pypokerengine.engine.poker_constants import PokerConstants as Const
+
+# File layout
+#   header : magic, version, seat_num, max_actions, record_size
+#   record : round_count, small_blind_amount, ante, dealer_btn, sb_pos, bb_pos,
+#            winner bit mask, 5 community card ids (0 = not dealt), action_num
+#            + seat_num    x [hole card id, hole card id, start stack, end stack, pay status]
+#            + max_actions x [street, seat, action, amount, paid]
+# Every record has the same size so the file can be memory-mapped and indexed directly.
+HEADER = struct.Struct("<4sHHHI2x")
+MAGIC = b"PKHH"
+VERSION = 1
+
+_ROUND_FMT = "IIIBBBH5BH"
+_SEAT_FMT = "BBiiB"
+_ACTION_FMT = "BBBII"
+_ROUND_FIELD_NUM = 13
+_SEAT_FIELD_NUM = 5
+_ACTION_FIELD_NUM = 5
+
+STREET_NAMES = ["preflop", "flop", "turn", "river"]
+
+ACTION_CODE = {
+    "FOLD": Const.Action.FOLD,
+    "CALL": Const.Action.CALL,
+    "RAISE": Const.Action.RAISE,
+    "SMALLBLIND": Const.Action.SMALL_BLIND,
+    "BIGBLIND": Const.Action.BIG_BLIND,
+    "ANTE": Const.Action.ANTE
+}
+ACTION_STR = { code:name for name, code in ACTION_CODE.items() }
+
+PAY_STATUS_CODE = {
+    DataEncoder.PAY_INFO_PAY_TILL_END_STR: PayInfo.PAY_TILL_END,
+    DataEncoder.PAY_INFO_ALLIN_STR: PayInfo.ALLIN,
+    DataEncoder.PAY_INFO_FOLDED_STR: PayInfo.FOLDED
+}
+PAY_STATUS_STR = { code:name for name, code in PAY_STATUS_CODE.items() }
+
+def record_struct(seat_num, max_actions):
+  return struct.Struct("<" + _ROUND_FMT + _SEAT_FMT * seat_num + _ACTION_FMT * max_actions)
+
+
+class HandHistoryRecorder:
+  """Streams every played round into an append-only fixed-width binary file.
+
+  Records are packed into an in-memory buffer and written with a single
+  write call every buffer_size rounds. Register it with Dealer.set_recorder.
+  """
+
+  def __init__(self, path, seat_num, max_actions=32, buffer_size=4096):
+    self.path = path
+    self.seat_num = seat_num
+    self.max_actions = max_actions
+    self.buffer_size = buffer_size
+    self.record = record_struct(seat_num, max_actions)
+    self.buffer = bytearray(self.record.size * buffer_size)
+    self.buffered_num = 0
+    self.file = self.__open(path)
+    self.__action_padding = [0] * (_ACTION_FIELD_NUM * max_actions)
+
+  def record_round(self, start_state, round_result_message):
+    """Pack one finished round.
+
+    start_state is the state returned by RoundManager.start_new_round (it still
+    holds the hole cards) and round_result_message the round result message.
+    """
+    players = start_state["table"].seats.players
+    if len(players) != self.seat_num:
+      raise ValueError(self.__wrong_seat_num_msg % (self.seat_num, len(players)))
+    round_state = round_result_message["round_state"]
+    seat_pos = { player.uuid:pos for pos, player in enumerate(players) }
+
+    actions, ante = self.__pack_actions(round_state["action_histories"], seat_pos)
+    board = [Card.from_str(card).to_id() for card in round_state["community_card"]]
+    board += [0] * (5 - len(board))
+    winner_mask = 0
+    for winner in round_result_message["winners"]:
+      winner_mask |= 1 << seat_pos[winner["uuid"]]
+
+    values = [
+        round_state["round_count"], round_state["small_blind_amount"], ante,
+        round_state["dealer_btn"], round_state["small_blind_pos"], round_state["big_blind_pos"],
+        winner_mask
+    ]
+    values += board
+    values.append(len(actions) // _ACTION_FIELD_NUM)
+    for player, seat in zip(players, round_state["seats"]):
+      hole = [card.to_id() for card in player.hole_card]
+      values += hole + [0] * (2 - len(hole))
+      values += [player.stack + player.pay_info.amount, seat["stack"], PAY_STATUS_CODE[seat["state"]]]
+    values += actions
+    values += self.__action_padding[len(actions):]
+
+    self.record.pack_into(self.buffer, self.buffered_num * self.record.size, *values)
+    self.buffered_num += 1
+    if self.buffered_num == self.buffer_size:
+      self.__write_buffer()
+
+  def flush(self):
+    self.__write_buffer()
+    self.file.flush()
+
+  def close(self):
+    if self.file.closed: return
+    self.flush()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def __pack_actions(self, action_histories, seat_pos):
+    packed, ante = [], 0
+    for street, street_name in enumerate(STREET_NAMES):
+      for history in action_histories.get(street_name, []):
+        action = ACTION_CODE[history["action"]]
+        amount = history.get("amount", 0)
+        paid = history.get("paid", amount)
+        if action == Const.Action.ANTE: ante = amount
+        packed += [street, seat_pos[history["uuid"]], action, amount, paid]
+    if len(packed) > len(self.__action_padding):
+      raise ValueError(self.__too_many_actions_msg % (len(packed) // _ACTION_FIELD_NUM, self.max_actions))
+    return packed, ante
+
+  def __write_buffer(self):
+    if self.buffered_num == 0: return
+    self.file.write(memoryview(self.buffer)[:self.buffered_num * self.record.size])
+    self.buffered_num = 0
+
+  def __open(self, path):
+    exists = os.path.exists(path) and os.path.getsize(path) != 0
+    if exists:
+      with open(path, "rb") as f:
+        header = read_header(f.read(HEADER.size))
+      if header["seat_num"] != self.seat_num or header["max_actions"] != self.max_actions:
+        raise ValueError(self.__header_mismatch_msg % (path, header["seat_num"], header["max_actions"]))
+    f = open(path, "ab")
+    if not exists:
+      f.write(HEADER.pack(MAGIC, VERSION, self.seat_num, self.max_actions, self.record.size))
+    return f
+
+  __wrong_seat_num_msg = "Recorder is configured for %d seats but the table has %d"
+  __too_many_actions_msg = "Round has %d actions but the recorder keeps only %d"
+  __header_mismatch_msg = "%s was recorded with seat_num=%d, max_actions=%d"
+
+
+class HandHistoryReader:
+  """Memory-mapped random access to a file written by HandHistoryRecorder."""
+
+  def __init__(self, path):
+    self.path = path
+    self.file = open(path, "rb")
+    self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = read_header(self.mmap[:HEADER.size])
+    self.seat_num = header["seat_num"]
+    self.max_actions = header["max_actions"]
+    self.record = record_struct(self.seat_num, self.max_actions)
+    self.size = (len(self.mmap) - HEADER.size) // self.record.size
+
+  def __len__(self):
+    return self.size
+
+  def __getitem__(self, idx):
+    if idx < 0: idx += self.size
+    if not 0 <= idx < self.size:
+      raise IndexError("hand index out of range")
+    return self.decode(self.raw(idx))
+
+  def __iter__(self):
+    for idx in range(self.size):
+      yield self.decode(self.raw(idx))
+
+  def raw(self, idx):
+    return self.record.unpack_from(self.mmap, HEADER.size + idx * self.record.size)
+
+  def decode(self, values):
+    head = values[:_ROUND_FIELD_NUM]
+    seat_end = _ROUND_FIELD_NUM + _SEAT_FIELD_NUM * self.seat_num
+    seats = [values[i:i+_SEAT_FIELD_NUM] for i in range(_ROUND_FIELD_NUM, seat_end, _SEAT_FIELD_NUM)]
+    action_num = head[12]
+    action_end = seat_end + _ACTION_FIELD_NUM * action_num
+    actions = [values[i:i+_ACTION_FIELD_NUM] for i in range(seat_end, action_end, _ACTION_FIELD_NUM)]
+    return {
+        "round_count": head[0],
+        "small_blind_amount": head[1],
+        "ante": head[2],
+        "dealer_btn": head[3],
+        "small_blind_pos": head[4],
+        "big_blind_pos": head[5],
+        "winners": [pos for pos in range(self.seat_num) if head[6] >> pos & 1],
+        "community_card": [cid for cid in head[7:12] if cid != 0],
+        "seats": [self.__decode_seat(seat) for seat in seats],
+        "actions": [self.__decode_action(action) for action in actions]
+    }
+
+  def close(self):
+    self.mmap.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def __decode_seat(self, seat):
+    return {
+        "hole_card": [cid for cid in seat[:2] if cid != 0],
+        "start_stack": seat[2],
+        "stack": seat[3],
+        "state": PAY_STATUS_STR[seat[4]]
+    }
+
+  def __decode_action(self, action):
+    return {
+        "street": action[0],
+        "seat": action[1],
+        "action": ACTION_STR[action[2]],
+        "amount": action[3],
+        "paid": action[4]
+    }
+
+
+def read_header(data):
+  magic, version, seat_num, max_actions, record_size = HEADER.unpack(data)
+  if magic != MAGIC:
+    raise ValueError("Not a hand history file (magic = %s)" % magic)
+  if version != VERSION:
+    raise ValueError("Unsupported hand history version %d" % version)
+  return { "seat_num": seat_num, "max_actions": max_actions, "record_size": record_size }
+
@@ -0,0 +1,111 @@
+import json
+from time import perf_counter
+
+from pypokerengine.engine.round_manager import RoundManager
+from pypokerengine.engine.action_checker import ActionChecker
+from pypokerengine.engine.data_encoder import DataEncoder
+from pypokerengine.engine.game_evaluator import GameEvaluator
+from pypokerengine.engine.dealer import MessageHandler
+from pypokerengine.players import BasePokerPlayer
+
+# (phase name, owner class, attribute) of every instrumented method
+PHASE_TARGETS = [
+    ("state_copy", RoundManager, "_RoundManager__deep_copy_state"),
+    ("legality_check", ActionChecker, "legal_actions"),
+    ("legality_check", ActionChecker, "correct_action"),
+    ("round_state_encoding", DataEncoder, "encode_round_state"),
+    ("round_state_encoding", DataEncoder, "encode_action_histories"),
+    ("message_dispatch", MessageHandler, "process_message"),
+    ("agent_decision", BasePokerPlayer, "respond_to_ask"),
+    ("agent_decision", BasePokerPlayer, "respond_to_ask_batch"),
+    ("showdown_evaluation", GameEvaluator, "judge"),
+    ("pot_building", GameEvaluator, "create_pot")
+]
+
+class PhaseProfiler:
+  """Accumulates wall time and call counts per engine phase.
+
+  The instrumented methods are only wrapped between enable and disable (or
+  inside a with block), so a game played without the profiler runs the
+  original code. Phases nest (message dispatch contains the agent decision,
+  encoding contains pot building), so both the inclusive time and the self
+  time without nested phases are reported.
+  """
+
+  def __init__(self, targets=PHASE_TARGETS):
+    self.targets = targets
+    self.stats = {}
+    self.wall_time = 0.0
+    self.__originals = []
+    self.__stack = []
+    self.__start = None
+
+  def enable(self):
+    if self.__originals: return
+    for phase, owner, name in self.targets:
+      original = owner.__dict__[name]
+      self.__originals.append((owner, name, original))
+      setattr(owner, name, self.__instrument(phase, original))
+    self.__start = perf_counter()
+
+  def disable(self):
+    if not self.__originals: return
+    self.wall_time += perf_counter() - self.__start
+    for owner, name, original in reversed(self.__originals):
+      setattr(owner, name, original)
+    self.__originals = []
+
+  def __enter__(self):
+    self.enable()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.disable()
+
+  def summary(self):
+    return {
+        "wall_time": self.wall_time,
+        "phases": { phase:dict(stat) for phase, stat in self.stats.items() }
+    }
+
+  def to_json(self):
+    return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+  def dump(self, path):
+    with open(path, "w") as f:
+      f.write(self.to_json())
+
+  def format_table(self):
+    base = "%-22s %10s %12s %12s %8s"
+    lines = [base % ("phase", "calls", "total[s]", "self[s]", "self%")]
+    for phase, stat in sorted(self.stats.items(), key=lambda e: -e[1]["self_time"]):
+      ratio = 100.0 * stat["self_time"] / self.wall_time if self.wall_time else 0.0
+      lines.append("%-22s %10d %12.4f %12.4f %7.1f%%" % (
+        phase, stat["calls"], stat["total_time"], stat["self_time"], ratio))
+    lines.append("%-22s %10s %12.4f" % ("wall time", "", self.wall_time))
+    return "\n".join(lines)
+
+  def __instrument(self, phase, original):
+    if isinstance(original, classmethod):
+      return classmethod(self.__timed(phase, original.__func__))
+    return self.__timed(phase, original)
+
+  def __timed(self, phase, func):
+    stat = self.stats.setdefault(phase, { "calls": 0, "total_time": 0.0, "self_time": 0.0 })
+    stack = self.__stack
+    def timed(*args, **kwargs):
+      stack.append(0.0)
+      start = perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        elapsed = perf_counter() - start
+        nested = stack.pop()
+        stat["calls"] += 1
+        stat["total_time"] += elapsed
+        stat["self_time"] += elapsed - nested
+        if stack: stack[-1] += elapsed
+    timed.__name__ = func.__name__
+    timed.__doc__ = func.__doc__
+    return timed
+
@@ -0,0 +1,268 @@
+import random
+
+from pypokerengine.engine.player import Player
+from pypokerengine.engine.pay_info import PayInfo
+from pypokerengine.engine.action_checker import ActionChecker
+from pypokerengine.engine.hand_evaluator import HandEvaluator
+from pypokerengine.engine.poker_constants import PokerConstants as Const
+
+FOLD = "fold"
+CALL = "call"
+RAISE = "raise"
+
+ALL_ACTIONS = (FOLD, CALL, RAISE)
+NO_RAISE_ACTIONS = (FOLD, CALL)
+
+_RAISE_HISTORIES = [Player.ACTION_RAISE_STR, Player.ACTION_SMALL_BLIND, Player.ACTION_BIG_BLIND]
+
+class RolloutState:
+  """Flat image of a running round that can be played to the end quickly.
+
+  apply_action follows RoundManager.apply_action rule for rule (agree amount,
+  big blind option, the raise cap counted over the player's previous streets,
+  the all-in / fold correction of ActionChecker.correct_action, side pots and
+  the int division of split pots) but only keeps per-seat lists of ints, so
+  no table copy, message or action history is built on the way.
+
+  Cards are Card.to_id() ids and the deck is drawn from its end like
+  Deck.draw_card, so a state built from a game_state deals the same board as
+  the engine would. Every seat that can reach showdown needs its hole cards,
+  either from the game_state or dealt by determinize.
+  """
+
+  def __init__(self):
+    self.uuids = []
+    self.round_count = 0
+    self.small_blind_amount = 0
+    self.sb_pos = 0
+    self.street = Const.Street.PREFLOP
+    self.next_player = None
+    self.stacks = []
+    self.paid = []           # Player.paid_sum() on the current street
+    self.pay_amount = []     # PayInfo.amount, chips put in the pot this round
+    self.status = []         # PayInfo status
+    self.acted = []          # has an action history on the current street
+    self.bb_option = []      # big blind who has not been asked on preflop yet
+    self.prior_raises = []   # raises on previous streets (ActionChecker raise cap)
+    self.street_raises = []
+    self.agree_amount = 0
+    self.min_raise = None    # amount + add_amount of the last raise
+    self.round_raise = None  # ActionChecker.round_raise_amount of the street
+    self.hole_card = []
+    self.community_card = []
+    self.deck = []
+
+  @classmethod
+  def from_game_state(self, game_state):
+    table = game_state["table"]
+    players = table.seats.players
+    state = self()
+    state.uuids = [player.uuid for player in players]
+    state.round_count = game_state["round_count"]
+    state.small_blind_amount = game_state["small_blind_amount"]
+    state.sb_pos = table.sb_pos()
+    state.street = game_state["street"]
+    state.next_player = game_state["next_player"]
+    state.stacks = [player.stack for player in players]
+    state.paid = [player.paid_sum() for player in players]
+    state.pay_amount = [player.pay_info.amount for player in players]
+    state.status = [player.pay_info.status for player in players]
+    state.acted = [len(player.action_histories) != 0 for player in players]
+    state.bb_option = [self.__has_bb_option(player) for player in players]
+    state.prior_raises = [self.__prior_raise_number(player) for player in players]
+    state.street_raises = [self.__count_raises(player.action_histories) for player in players]
+    state.agree_amount = ActionChecker.agree_amount(players)
+    state.min_raise = self.__min_raise(players)
+    state.round_raise = ActionChecker.round_raise_amount(state.small_blind_amount, state.street)
+    state.hole_card = [[card.to_id() for card in player.hole_card] for player in players]
+    state.community_card = [card.to_id() for card in table.get_community_card()]
+    state.deck = [card.to_id() for card in table.deck.deck]
+    return state
+
+  def copy(self):
+    state = RolloutState.__new__(RolloutState)
+    state.__dict__.update(self.__dict__)
+    for name in self.__list_fields:
+      setattr(state, name, getattr(self, name)[:])
+    return state
+
+  def shuffle_deck(self, rng=random):
+    """Randomize the cards the rest of the round will draw.
+
+    Only the end of the deck is ever drawn, so a partial Fisher-Yates pass over
+    the missing community cards is enough to make them uniformly random.
+    """
+    deck = self.deck
+    top = len(deck) - 1
+    for _ in range(5 - len(self.community_card)):
+      idx = int(rng.random() * (top + 1))
+      deck[idx], deck[top] = deck[top], deck[idx]
+      top -= 1
+
+  def determinize(self, known_seats, rng=random):
+    """Deal random hole cards to the active seats not in known_seats and rebuild the deck.
+
+    The deck becomes every card not held by a known seat nor on the board, so
+    the dealt hole cards and the rest of the board are consistent with what
+    the known seats can see.
+    """
+    known_ids = set(self.community_card)
+    for pos in known_seats:
+      known_ids.update(self.hole_card[pos])
+    deck = [cid for cid in range(1, 53) if cid not in known_ids]
+    unknown_seats = [pos for pos, status in enumerate(self.status) if pos not in known_seats and status != PayInfo.FOLDED]
+    top = len(deck) - 1
+    for _ in range(2 * len(unknown_seats) + 5 - len(self.community_card)):
+      idx = int(rng.random() * (top + 1))
+      deck[idx], deck[top] = deck[top], deck[idx]
+      top -= 1
+    self.hole_card = self.hole_card[:]
+    for pos in unknown_seats:
+      self.hole_card[pos] = [deck.pop(), deck.pop()]
+    self.deck = deck
+
+  def missing_hole_card_seats(self):
+    return [pos for pos, status in enumerate(self.status) if status != PayInfo.FOLDED and len(self.hole_card[pos]) != 2]
+
+  def is_finished(self):
+    return self.street == Const.Street.FINISHED
+
+  def legal_actions(self):
+    if self.agree_amount < self.round_raise[1] and self.prior_raises[self.next_player] < 4:
+      return ALL_ACTIONS
+    return NO_RAISE_ACTIONS
+
+  def apply_action(self, action):
+    pos = self.next_player
+    paid = self.paid[pos]
+    allin_amount = self.stacks[pos] + paid
+    if action == RAISE:
+      amount = self.agree_amount + self.round_raise[0]
+      min_raise = self.min_raise if self.min_raise is not None else self.small_blind_amount * 2
+      if amount != allin_amount and (amount > allin_amount or min_raise > amount):
+        action = FOLD
+    if action == FOLD:
+      self.status[pos] = PayInfo.FOLDED
+    elif action == CALL or action == RAISE:
+      if action == CALL: amount = min(self.agree_amount, allin_amount)
+      if amount == allin_amount: self.status[pos] = PayInfo.ALLIN
+      self.stacks[pos] -= amount - paid
+      self.pay_amount[pos] += amount - paid
+      self.paid[pos] = amount
+      if action == RAISE:
+        self.min_raise = amount + amount - self.agree_amount
+        self.agree_amount = amount
+        self.street_raises[pos] += 1
+    else:
+      raise ValueError("Unexpected action %s received" % action)
+    self.acted[pos] = True
+    self.bb_option[pos] = False
+
+    if self.__is_everyone_agreed():
+      self.__finish_street()
+      self.street += 1
+      self.__start_street()
+    else:
+      self.next_player = self.__next_waiting_pos(pos + 1)
+    return self
+
+  def __is_everyone_agreed(self):
+    paid, acted, bb_option = self.paid, self.acted, self.bb_option
+    max_pay = max(paid)
+    everyone_agreed, active_num, waiting = True, 0, []
+    for pos, status in enumerate(self.status):
+      if status == PayInfo.FOLDED: continue
+      active_num += 1
+      if status != PayInfo.PAY_TILL_END: continue
+      waiting.append(pos)
+      if not acted[pos] or bb_option[pos] or paid[pos] != max_pay: everyone_agreed = False
+    lonely_player = active_num == 1
+    no_need_to_ask = len(waiting) == 1 and paid[waiting[0]] == max_pay
+    return everyone_agreed or lonely_player or no_need_to_ask
+
+  def __finish_street(self):
+    seat_num = len(self.uuids)
+    self.prior_raises = [prior + raised for prior, raised in zip(self.prior_raises, self.street_raises)]
+    self.street_raises = [0] * seat_num
+    self.paid = [0] * seat_num
+    self.acted = [False] * seat_num
+    self.bb_option = [False] * seat_num
+    self.agree_amount = 0
+    self.min_raise = None
+
+  def __start_street(self):
+    while True:
+      street = self.street
+      if street == Const.Street.SHOWDOWN:
+        return self.__showdown()
+      if street > Const.Street.SHOWDOWN or street == Const.Street.PREFLOP:
+        raise ValueError("Street is already finished [street = %d]" % street)
+      self.next_player = self.__next_waiting_pos(self.sb_pos)
+      self.round_raise = ActionChecker.round_raise_amount(self.small_blind_amount, street)
+      for _ in range(3 if street == Const.Street.FLOP else 1):
+        self.community_card.append(self.deck.pop())
+      if self.status.count(PayInfo.PAY_TILL_END) > 1: return
+      self.street += 1
+
+  def __showdown(self):
+    contenders = [pos for pos, status in enumerate(self.status) if status != PayInfo.FOLDED]
+    scores = [0] * len(self.uuids)
+    if len(contenders) > 1:
+      for pos in contenders:
+        scores[pos] = HandEvaluator.eval_hand_from_ids(self.hole_card[pos], self.community_card)
+    for amount, eligibles in self.__pots():
+      active = [pos for pos in eligibles if self.status[pos] != PayInfo.FOLDED]
+      best_score = max([scores[pos] for pos in active])
+      winners = [pos for pos in active if scores[pos] == best_score]
+      prize = int(amount / len(winners))
+      for pos in winners:
+        self.stacks[pos] += prize
+    self.street += 1
+
+  def __pots(self):
+    pay_amount, status = self.pay_amount, self.status
+    pots, side_pot_sum = [], 0
+    allin_amounts = sorted([pay for pay, st in zip(pay_amount, status) if st == PayInfo.ALLIN])
+    for allin_amount in allin_amounts:
+      amount = sum([min(allin_amount, pay) for pay in pay_amount]) - side_pot_sum
+      eligibles = [pos for pos, pay in enumerate(pay_amount) if pay >= allin_amount and status[pos] != PayInfo.FOLDED]
+      pots.append((amount, eligibles))
+      side_pot_sum += amount
+    max_pay = max(pay_amount)
+    pots.append((sum(pay_amount) - side_pot_sum, [pos for pos, pay in enumerate(pay_amount) if pay == max_pay]))
+    return pots
+
+  def __next_waiting_pos(self, start_pos):
+    seat_num = len(self.status)
+    for offset in range(seat_num):
+      pos = (start_pos + offset) % seat_num
+      if self.status[pos] == PayInfo.PAY_TILL_END: return pos
+    return None
+
+  @classmethod
+  def __has_bb_option(self, player):
+    histories = player.action_histories
+    return player.round_action_histories[0] is None and len(histories) == 1\
+        and histories[0]["action"] == Player.ACTION_BIG_BLIND
+
+  @classmethod
+  def __prior_raise_number(self, player):
+    raised_number = 0
+    for histories in player.round_action_histories:
+      if histories is None: break
+      raised_number += self.__count_raises(histories)
+    return raised_number
+
+  @classmethod
+  def __count_raises(self, histories):
+    return len([h for h in histories if h["action"] == Player.ACTION_RAISE_STR])
+
+  @classmethod
+  def __min_raise(self, players):
+    raises = [h for player in players for h in player.action_histories if h["action"] in _RAISE_HISTORIES]
+    if len(raises) == 0: return None
+    last_raise = max(raises, key=lambda h: h["amount"])
+    return last_raise["amount"] + last_raise["add_amount"]
+
+  __list_fields = ["stacks", "paid", "pay_amount", "status", "acted", "bb_option",
+      "prior_raises", "street_raises", "community_card", "deck"]
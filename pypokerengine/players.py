@@ -39,6 +39,15 @@ class BasePokerPlayer(object):
     err_msg = self.__build_err_msg("receive_round_result_message")
     raise NotImplementedError(err_msg)
 
+  def declare_actions_batch(self, observations):
+    """Declare actions for several pending decisions at once
+
+    Each observation is a (valid_actions, hole_card, round_state) tuple and
+    one action has to be returned per observation, in the same order.
+    Override this to vectorize the decision over lock-stepped tables.
+    """
+    return [self.declare_action(*observation) for observation in observations]
+
   def set_uuid(self, uuid):
     self.uuid = uuid
 
@@ -47,6 +56,11 @@ class BasePokerPlayer(object):
     valid_actions, hole_card, round_state = self.__parse_ask_message(message)
     return self.declare_action(valid_actions, hole_card, round_state)
 
+  def respond_to_ask_batch(self, messages):
+    """Called from BatchScheduler with every pending ask message of this player"""
+    observations = [self.__parse_ask_message(message) for message in messages]
+    return self.declare_actions_batch(observations)
+
   def receive_notification(self, message):
     """Called from Dealer when notification received from RoundManager"""
     msg_type = message["message_type"]
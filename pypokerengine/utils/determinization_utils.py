@@ -0,0 +1,130 @@
+import numpy as np
+
+from pypokerengine.engine.card import Card
+from pypokerengine.engine.deck import Deck
+from pypokerengine.engine.data_encoder import DataEncoder
+from pypokerengine.utils.game_state_utils import deepcopy_game_state
+
+# The 1326 two card combos as (low id, high id) pairs of Card.to_id() ids. Ranges passed
+# to sample_worlds are weight vectors in this order.
+COMBOS = np.array([(c1, c2) for c1 in range(1, 53) for c2 in range(c1 + 1, 53)], dtype=np.int8)
+_COMBO_INDEX = np.full((53, 53), -1, dtype=np.int16)
+_COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(len(COMBOS))
+_COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(len(COMBOS))
+# card id -> the 51 combos holding it (row 0 unused)
+_CARD_COMBOS = np.zeros((53, 51), dtype=np.intp)
+for _cid in range(1, 53):
+    _CARD_COMBOS[_cid] = np.nonzero((COMBOS[:, 0] == _cid) | (COMBOS[:, 1] == _cid))[0]
+
+def combo_index(card_id1, card_id2):
+    return int(_COMBO_INDEX[card_id1, card_id2])
+
+def sample_worlds(round_state, uuid, hole_card, world_num, ranges=None, seed=None):
+    """Deal world_num determinizations of the hidden cards of round_state at once.
+
+    uuid / hole_card are the observing player and its hole cards (as given to
+    declare_action). Every other player still in the round gets two hole cards and the
+    board is completed to five cards, never reusing a card seen by the observer or dealt
+    elsewhere in the same world.
+
+    ranges optionally maps an opponent uuid to 1326 combo weights (COMBOS order). Those
+    opponents are dealt first, one after the other, by inverse CDF over their weights with
+    the combos blocked in each world masked out; the remaining hole cards and the board are
+    taken from a random-key argsort of the unused cards. Nothing is resampled, so the cost
+    is fixed (a few milliseconds for 1000 worlds).
+
+    Returns a dict of arrays of Card.to_id() ids:
+      "opponent_uuids": [uuid, ...]
+      "opponent_hole_card": (world_num, len(opponent_uuids), 2)
+      "community_card": (world_num, 5), the known cards first
+    """
+    rng = np.random.default_rng(seed)
+    ranges = ranges or {}
+    hole_ids = [Card.from_str(card).to_id() for card in hole_card]
+    community_ids = [Card.from_str(card).to_id() for card in round_state["community_card"]]
+    opponent_uuids = [seat["uuid"] for seat in round_state["seats"]
+            if seat["uuid"] != uuid and seat["state"] != DataEncoder.PAY_INFO_FOLDED_STR]
+
+    opponent_hole = np.zeros((world_num, len(opponent_uuids), 2), dtype=np.int8)
+    ranged_idx = [idx for idx, opponent_uuid in enumerate(opponent_uuids) if opponent_uuid in ranges]
+    for order, idx in enumerate(ranged_idx):
+        dealt = opponent_hole[:, ranged_idx[:order]].reshape(world_num, -1)
+        opponent_hole[:, idx] = _sample_from_range(
+                ranges[opponent_uuids[idx]], hole_ids + community_ids, dealt, rng)
+
+    dead = np.zeros((world_num, 53), dtype=bool)
+    dead[:, [0] + hole_ids + community_ids] = True
+    dead[np.arange(world_num)[:, None], opponent_hole[:, ranged_idx].reshape(world_num, -1)] = True
+
+    uniform_idx = [idx for idx, opponent_uuid in enumerate(opponent_uuids) if opponent_uuid not in ranges]
+    draw_num = 2 * len(uniform_idx) + 5 - len(community_ids)
+    keys = rng.random((world_num, 53))
+    keys[dead] = 2.0  # unused cards first
+    drawn = np.argsort(keys, axis=1)[:, :draw_num].astype(np.int8)
+    for order, idx in enumerate(uniform_idx):
+        opponent_hole[:, idx] = drawn[:, 2 * order:2 * order + 2]
+
+    community = np.empty((world_num, 5), dtype=np.int8)
+    community[:, :len(community_ids)] = community_ids
+    community[:, len(community_ids):] = drawn[:, 2 * len(uniform_idx):]
+    return {
+            "opponent_uuids": opponent_uuids,
+            "opponent_hole_card": opponent_hole,
+            "community_card": community
+            }
+
+def build_world_game_state(game_state, uuid, hole_card, worlds, idx):
+    """Copy of game_state (e.g. from restore_game_state) set up as world idx of sample_worlds.
+
+    Every player still in the round gets its hole cards and the deck is arranged so the
+    engine deals the sampled board, so the state can be played with the Emulator.
+    """
+    state = deepcopy_game_state(game_state)
+    table = state["table"]
+    players = { player.uuid: player for player in table.seats.players }
+    players[uuid].hole_card = [Card.from_str(card) for card in hole_card]
+    used_ids = set([card.to_id() for card in players[uuid].hole_card])
+    for opponent_uuid, hole_ids in zip(worlds["opponent_uuids"], worlds["opponent_hole_card"][idx]):
+        players[opponent_uuid].hole_card = [Card.from_id(int(cid)) for cid in hole_ids]
+        used_ids.update(int(cid) for cid in hole_ids)
+    community_ids = [int(cid) for cid in worlds["community_card"][idx]]
+    future_ids = community_ids[len(table.get_community_card()):]
+    used_ids.update(community_ids)
+    rest_ids = [cid for cid in range(1, 53) if cid not in used_ids]
+    # Deck.draw_card pops from the end
+    table.deck = Deck(deck_ids=rest_ids + future_ids[::-1])
+    return state
+
+def _sample_from_range(weights, known_ids, dealt, rng):
+    """Inverse CDF sampling of one combo per world.
+
+    The CDF of the range without the combos blocked by known_ids is shared by all worlds.
+    The combos blocked by the cards already dealt in a world (dealt, one row per world)
+    are handled as removed mass: the remaining CDF at a removed combo is the shared CDF
+    minus the weight removed up to it, so the removed combos lying below the pick are those
+    whose remaining CDF does not exceed it, and the pick shifted by their weight is searched
+    in the shared CDF.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (len(COMBOS),):
+        raise ValueError("A range needs %d combo weights but got shape %s" % (len(COMBOS), weights.shape))
+    world_num = len(dealt)
+    base = weights.copy()
+    base[_CARD_COMBOS[known_ids].ravel()] = 0.0
+    base_cdf = np.cumsum(base)
+
+    removed_idx = np.sort(_CARD_COMBOS[dealt].reshape(world_num, -1), axis=1)
+    removed_weight = base[removed_idx]
+    removed_weight[:, 1:][removed_idx[:, 1:] == removed_idx[:, :-1]] = 0.0  # combo of two dealt cards
+    cum_removed = np.zeros((world_num, removed_idx.shape[1] + 1))
+    np.cumsum(removed_weight, axis=1, out=cum_removed[:, 1:])
+    total = base_cdf[-1] - cum_removed[:, -1]
+    if np.any(total <= 0):
+        raise ValueError("Every combo of the range is blocked by known cards in some world")
+
+    picks = rng.random(world_num) * total
+    remaining_cdf = base_cdf[removed_idx] - cum_removed[:, 1:]
+    removed_below = (remaining_cdf <= picks[:, None]).sum(axis=1)
+    shifted = picks + cum_removed[np.arange(world_num), removed_below]
+    combo_idx = np.searchsorted(base_cdf, shifted, side="right")
+    return COMBOS[np.minimum(combo_idx, len(COMBOS) - 1)]
@@ -1,4 +1,4 @@
-from functools import reduce
+from itertools import chain
 
 from pypokerengine.engine.table import Table
 from pypokerengine.engine.seats import Seats
@@ -18,6 +18,110 @@ def restore_game_state(round_state):
             "table": _restore_table(round_state)
             }
 
+class GameStateDecoder(object):
+    """Restores the round_state of the round being played, reusing the previous restore.
+
+    decode(round_state) returns the same game state as restore_game_state, but the table
+    restored on the previous call for the same round (same round_count and seats) is kept
+    and only the action histories and community cards added since then are applied, so an
+    agent restoring the state at every decision pays for the new actions only. Anything
+    that does not extend the cached round (another round, another table) is restored from
+    scratch.
+
+    The returned state shares the cached table, so treat it as read-only. The helpers of
+    this module and RoundManager.apply_action copy the state before changing it.
+    """
+
+    def __init__(self):
+        self.round_key = None
+        self.table = None
+        self.players = {}
+        self.street_names = []
+        self.applied = {}  # street name -> (applied history num, last applied history)
+
+    def decode(self, round_state):
+        if self.__extends_cached_round(round_state):
+            self.__apply_new_histories(round_state)
+            self.__update_seats(round_state["seats"])
+            self.__update_community_card(round_state["community_card"])
+        else:
+            self.__restore(round_state)
+        return {
+                "round_count": round_state["round_count"],
+                "small_blind_amount": round_state["small_blind_amount"],
+                "street": _street_flg_translator[round_state["street"]],
+                "next_player": round_state["next_player"],
+                "table": self.table
+                }
+
+    def __restore(self, round_state):
+        self.round_key = _round_key(round_state)
+        self.table = _restore_table(round_state)
+        self.players = { player.uuid: player for player in self.table.seats.players }
+        self.street_names = _ordered_street_names(round_state["action_histories"])
+        self.applied = {}
+        for street_name in self.street_names:
+            self.__mark_applied(street_name, round_state["action_histories"][street_name])
+
+    def __extends_cached_round(self, round_state):
+        if self.table is None or self.round_key != _round_key(round_state): return False
+        action_histories = round_state["action_histories"]
+        street_names = _ordered_street_names(action_histories)
+        if street_names[:len(self.street_names)] != self.street_names: return False
+        for street_name in self.street_names:
+            histories = action_histories[street_name]
+            applied_num, last_history = self.applied[street_name]
+            if len(histories) < applied_num: return False
+            if applied_num != 0 and histories[applied_num-1] != last_history: return False
+        cached_cards = [str(card) for card in self.table.get_community_card()]
+        return round_state["community_card"][:len(cached_cards)] == cached_cards
+
+    def __apply_new_histories(self, round_state):
+        action_histories = round_state["action_histories"]
+        street_names = _ordered_street_names(action_histories)
+        current_street_name = street_names[-1]
+        for street_name in street_names:
+            street_flg = _street_flg_translator[street_name]
+            is_past_street = street_name != current_street_name
+            if is_past_street and street_name == self.street_names[-1]:
+                for player in self.players.values():
+                    player.round_action_histories[street_flg] = player.action_histories
+                    player.action_histories = []
+            elif is_past_street and street_name not in self.applied:
+                for player in self.players.values(): player.round_action_histories[street_flg] = []
+            histories = action_histories[street_name]
+            applied_num = self.applied[street_name][0] if street_name in self.applied else 0
+            for action_history in histories[applied_num:]:
+                player = self.players[action_history["uuid"]]
+                target = player.round_action_histories[street_flg] if is_past_street else player.action_histories
+                target.append(action_history)
+                player.pay_info.amount += _fetch_pay_amount(action_history)
+            self.__mark_applied(street_name, histories)
+        self.street_names = street_names
+
+    def __mark_applied(self, street_name, histories):
+        self.applied[street_name] = (len(histories), histories[-1] if histories else None)
+
+    def __update_seats(self, seats_info):
+        for player, info in zip(self.table.seats.players, seats_info):
+            player.stack = info["stack"]
+            player.pay_info.status = _pay_info_state_translator[info["state"]]
+
+    def __update_community_card(self, card_data):
+        new_cards = [Card.from_str(str_card) for str_card in card_data[len(self.table.get_community_card()):]]
+        if len(new_cards) == 0: return
+        for card in new_cards:
+            self.table.add_community_card(card)
+        new_ids = set([card.to_id() for card in new_cards])
+        self.table.deck.deck = [card for card in self.table.deck.deck if card.to_id() not in new_ids]
+
+
+def _round_key(round_state):
+    return round_state["round_count"], tuple([info["uuid"] for info in round_state["seats"]])
+
+def _ordered_street_names(round_action_histories):
+    return sorted(round_action_histories.keys(), key=lambda x:_street_flg_translator[x])
+
 def attach_hole_card_from_deck(game_state, uuid):
     deepcopy = deepcopy_game_state(game_state)
     hole_card = deepcopy["table"].deck.draw_cards(2)
@@ -68,11 +172,10 @@ _street_flg_translator = {
         }
 
 def _restore_table(round_state):
-    table = Table()
+    table = Table(cheat_deck=_restore_deck(round_state["community_card"]))
     table.dealer_btn = round_state["dealer_btn"]
     table.set_blind_pos(round_state["small_blind_pos"], round_state["big_blind_pos"])
     _restore_community_card_on_table(table, round_state["community_card"])
-    table.deck = _restore_deck(round_state["community_card"])
     table.seats = _restore_seats(round_state["seats"], round_state["action_histories"])
     return table
 
@@ -81,11 +184,8 @@ def _restore_community_card_on_table(table, card_data):
         table.add_community_card(Card.from_str(str_card))
 
 def _restore_deck(str_exclude_cards):
-    deck = Deck()
-    exclude_ids = [Card.to_id(Card.from_str(s)) for s in str_exclude_cards]
-    deck_cards = [Card.from_id(cid) for cid in range(1, 53) if cid not in exclude_ids]
-    deck.deck = deck_cards
-    return deck
+    exclude_ids = set([Card.to_id(Card.from_str(s)) for s in str_exclude_cards])
+    return Deck(deck_ids=[cid for cid in range(1, 53) if cid not in exclude_ids])
 
 def _restore_seats(seats_info, action_histories):
     players = [Player(info["uuid"], info["stack"], info["name"]) for info in seats_info]
@@ -97,7 +197,8 @@ def _restore_seats(seats_info, action_histories):
     return seats
 
 def _restore_action_histories_on_players(players, round_action_histories):
-    ordered_street_names = sorted(round_action_histories.keys(), key=lambda x:_street_flg_translator[x])
+    players_by_uuid = { player.uuid: player for player in players }
+    ordered_street_names = _ordered_street_names(round_action_histories)
     current_street_name = ordered_street_names[-1]
     past_street_names = ordered_street_names[:-1]
 
@@ -107,12 +208,12 @@ def _restore_action_histories_on_players(players, round_action_histories):
         action_histories = round_action_histories[street_name]
         for player in players: player.round_action_histories[street_flg] = []
         for action_history in action_histories:
-            player = _find_user_by_uuid(players, action_history["uuid"])
+            player = players_by_uuid[action_history["uuid"]]
             player.round_action_histories[street_flg].append(action_history)
 
     # resotre action_histories
     for action_history in round_action_histories[current_street_name]:
-        player = _find_user_by_uuid(players, action_history["uuid"])
+        player = players_by_uuid[action_history["uuid"]]
         player.action_histories.append(action_history)
 
 def _restore_pay_info_on_players(players, players_state, round_action_histories):
@@ -120,15 +221,13 @@ def _restore_pay_info_on_players(players, players_state, round_action_histories)
     _restore_pay_info_amount_on_players(players, round_action_histories)
 
 def _restore_pay_info_amount_on_players(players, round_action_histories):
-    ordered_street_names = sorted(round_action_histories.keys(), key=lambda x:_street_flg_translator[x])
-    all_histories = reduce(lambda ary, key: ary + round_action_histories[key], ordered_street_names, [])
+    players_by_uuid = { player.uuid: player for player in players }
+    ordered_street_names = _ordered_street_names(round_action_histories)
+    all_histories = chain.from_iterable(round_action_histories[key] for key in ordered_street_names)
     for action_history in all_histories:
-        player = _find_user_by_uuid(players, action_history["uuid"])
+        player = players_by_uuid[action_history["uuid"]]
         player.pay_info.amount += _fetch_pay_amount(action_history)
 
-def _find_user_by_uuid(players, uuid):
-    return [player for player in players if player.uuid==uuid][0]
-
 def _fetch_pay_amount(action_history):
     action = action_history["action"]
     if action == Player.ACTION_FOLD_STR: return 0
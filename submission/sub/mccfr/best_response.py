@@ -0,0 +1,249 @@
+import argparse
+import numpy as np
+from monte_carlo import GameState, INTERNAL_ACTIONS, PLAYER_COUNT, STREETS, BOARD_SIZES, BIG_BLIND
+from node_table import NodeTable
+from sub.mccfr.compiled_strategy import CompiledStrategy, QUANT_SCALE
+from sub.mccfr.mccfr_abstraction import get_card_key, get_betting_key, parse_legacy_key, CARD_ABSTRACTIONS
+
+NOT_TERMINAL, FOLD, SHOWDOWN = 0, 1, 2
+
+class PublicTree:
+    """Every betting sequence of the monte_carlo.GameState rules, cards left out.
+
+    Stacks never limit a bet (at most 170 of 200 chips go in), so the betting is the
+    same for every deal. The tree is built by walking a GameState with apply_action /
+    undo; chance nodes are skipped, the child of a street closing action is the first
+    node of the next street. Per node lists, indexed by node id:
+      street, player (-1 on terminals), history (current street actions), raises,
+      valid_actions, children ({action: node}), terminal, winner (fold terminals),
+      bets (chips put in per player)
+    """
+    def __init__(self):
+        self.street, self.player, self.history, self.raises = [], [], [], []
+        self.valid_actions, self.children, self.terminal, self.winner, self.bets = [], [], [], [], []
+        game_state = GameState()
+        self.__build(game_state)
+        # decision nodes sharing street and street history share their infoset keys for a
+        # given deal, and all their children are in earlier groups of this order (bottom up)
+        groups = {}
+        for node, terminal in enumerate(self.terminal):
+            if terminal == NOT_TERMINAL:
+                groups.setdefault((self.street[node], self.history[node]), []).append(node)
+        self.groups = [groups[group] for group in sorted(groups, key=lambda g: (-g[0], -len(g[1])))]
+
+    def __len__(self):
+        return len(self.street)
+
+    def __build(self, game_state):
+        token = len(game_state.undo_log)
+        while game_state.is_chance_node():
+            game_state.advance_street()
+        node = len(self.street)
+        street = STREETS.index(game_state.street)
+        self.street.append(street)
+        self.history.append("".join(game_state.history[game_state.street]))
+        self.raises.append(game_state.num_street_raises)
+        self.bets.append(tuple(game_state.round_bets))
+        self.children.append({})
+        if game_state.is_terminal():
+            self.terminal.append(FOLD if game_state.winner >= 0 else SHOWDOWN)
+            self.winner.append(game_state.winner)
+            self.player.append(-1)
+            self.valid_actions.append([])
+        else:
+            self.terminal.append(NOT_TERMINAL)
+            self.winner.append(-1)
+            self.player.append(game_state.get_current_player())
+            self.valid_actions.append(game_state.get_valid_actions())
+            for action in self.valid_actions[node]:
+                action_token = game_state.apply_action(action)
+                self.children[node][action] = self.__build(game_state)
+                game_state.undo(action_token)
+        game_state.undo(token) # the street advances of this call
+        return node
+
+
+class Deals:
+    """deal_num sampled deals: hole cards of both players and the full board, as monte_carlo
+    card ints, with the card part of every infoset key (in abstraction) and the showdown winner."""
+    def __init__(self, deal_num, seed=None, abstraction="buckets"):
+        rng = np.random.default_rng(seed)
+        cards = np.argsort(rng.random((deal_num, 52)), axis=1)[:, :9]
+        self.hole_cards = cards[:, :4].reshape(deal_num, PLAYER_COUNT, 2)
+        self.board = cards[:, 4:]
+        evaluator = GameState()
+        card_str = evaluator.card_int_to_str
+        # card part of the key per street and player; the node adds the betting part
+        self.base_keys = np.zeros((deal_num, len(STREETS), PLAYER_COUNT), dtype=np.int64)
+        self.winner = np.zeros(deal_num, dtype=np.int64)
+        for deal in range(deal_num):
+            hole_str = [[card_str(int(c)) for c in self.hole_cards[deal, p]] for p in range(PLAYER_COUNT)]
+            board_str = [card_str(int(c)) for c in self.board[deal]]
+            for street, name in enumerate(STREETS):
+                for p in range(PLAYER_COUNT):
+                    self.base_keys[deal, street, p] = get_card_key(name, hole_str[p], board_str[:BOARD_SIZES[street]], abstraction)
+            evaluator.hole_cards = [list(map(int, self.hole_cards[deal, p])) for p in range(PLAYER_COUNT)]
+            evaluator.community_cards = list(map(int, self.board[deal]))
+            self.winner[deal] = evaluator.eval_win()
+
+    def __len__(self):
+        return len(self.winner)
+
+
+def strategy_arrays(strategy):
+    """Sorted int64 keys and (n x 3) action probabilities of a NodeTable (average strategy),
+    CompiledStrategy, or key -> probabilities dict (string keys are parsed)."""
+    if isinstance(strategy, NodeTable):
+        keys, probs = np.array(strategy.keys, dtype=np.int64), strategy.average_strategies()
+    elif isinstance(strategy, CompiledStrategy):
+        keys, probs = np.asarray(strategy.keys, dtype=np.int64), strategy.probs / QUANT_SCALE
+    else:
+        keys = np.array([parse_legacy_key(key) if isinstance(key, str) else key for key in strategy], dtype=np.int64)
+        probs = np.array([list(p) for p in strategy.values()], dtype=float).reshape(len(keys), len(INTERNAL_ACTIONS))
+    order = np.argsort(keys)
+    return keys[order], np.asarray(probs, dtype=float)[order]
+
+def _lookup(keys, table_keys, table_values, default):
+    if len(table_keys) == 0:
+        return np.full(keys.shape + table_values.shape[1:], default, dtype=table_values.dtype)
+    idx = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    found = table_keys[idx] == keys
+    values = table_values[idx]
+    values[~found] = default
+    return values
+
+# probabilities over the valid actions of node for every deal, renormalized (uniform if all zero)
+def _node_strategy(tree, node, keys, strategy):
+    probs = _lookup(keys, strategy[0], strategy[1], 1.0 / len(INTERNAL_ACTIONS))
+    mask = np.zeros(len(INTERNAL_ACTIONS))
+    mask[tree.valid_actions[node]] = 1.0
+    probs = probs * mask
+    norm = probs.sum(axis=1, keepdims=True)
+    return np.divide(probs, norm, out=np.broadcast_to(mask / mask.sum(), probs.shape).copy(), where=norm > 0)
+
+def _node_keys(tree, node, deals, player):
+    return deals.base_keys[:, tree.street[node], player] | get_betting_key(tree.history[node], tree.raises[node])
+
+def best_response(tree, strategy, deals, br_player, policy=None):
+    """Value per deal of br_player best responding to strategy (from strategy_arrays).
+
+    Without policy the best response is chosen per infoset key: the action with the
+    highest counterfactual value summed over the deals and nodes of the key. With a
+    policy (sorted keys, action) from an earlier call it is only evaluated; keys it
+    has not seen follow strategy. Returns the root values and the policy.
+    """
+    opponent = 1 - br_player
+    deal_num = len(deals)
+    # opponent reach of the best responder's nodes and the opponent strategy at its own
+    # nodes, top down (node ids are in depth first order)
+    reach, opponent_probs = {0: np.ones(deal_num)}, {}
+    for node in range(len(tree)):
+        if tree.terminal[node] != NOT_TERMINAL:
+            continue
+        if tree.player[node] == opponent:
+            node_reach = reach.pop(node)
+            probs = opponent_probs[node] = _node_strategy(tree, node, _node_keys(tree, node, deals, opponent), strategy)
+        for action, child in tree.children[node].items():
+            if tree.terminal[child] == NOT_TERMINAL:
+                reach[child] = node_reach * probs[:, action] if tree.player[node] == opponent else reach[node]
+
+    values = {}
+    def child_value(child):
+        value = values.pop(child, None)
+        if value is not None:
+            return value
+        bets, pot = tree.bets[child], sum(tree.bets[child])
+        if tree.terminal[child] == FOLD:
+            return np.full(deal_num, pot - bets[br_player] if tree.winner[child] == br_player else -bets[br_player], dtype=float)
+        return np.where(deals.winner == br_player, pot - bets[br_player],
+                        np.where(deals.winner == -2, pot / 2 - bets[br_player], -bets[br_player])).astype(float)
+
+    policy_keys, policy_actions = [], []
+    for group in tree.groups:
+        if tree.player[group[0]] == opponent:
+            for node in group:
+                probs = opponent_probs.pop(node)
+                values[node] = sum(probs[:, action] * child_value(child) for action, child in tree.children[node].items())
+            continue
+        valid = tree.valid_actions[group[0]]
+        node_keys = [_node_keys(tree, node, deals, br_player) for node in group]
+        action_values = [np.stack([child_value(tree.children[node][action]) for action in valid], axis=1) for node in group]
+        if policy is None:
+            keys = np.concatenate(node_keys)
+            weighted = np.concatenate([av * reach[node][:, None] for node, av in zip(group, action_values)])
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            sums = np.stack([np.bincount(inverse, weights=weighted[:, i], minlength=len(unique_keys)) for i in range(len(valid))], axis=1)
+            best = np.argmax(sums, axis=1)
+            policy_keys.append(unique_keys)
+            policy_actions.append(np.array(valid)[best])
+            choice = np.split(best[inverse], len(group))
+            for node, av, idx in zip(group, action_values, choice):
+                values[node] = av[np.arange(deal_num), idx]
+        else:
+            for node, keys, av in zip(group, node_keys, action_values):
+                own = _node_strategy(tree, node, keys, strategy)[:, valid]
+                chosen = _lookup(keys, policy[0], policy[1], -1)
+                picked = np.searchsorted(valid, np.maximum(chosen, 0))
+                values[node] = np.where(chosen >= 0, av[np.arange(deal_num), np.minimum(picked, len(valid) - 1)], (own * av).sum(axis=1))
+    if policy is None:
+        keys = np.concatenate(policy_keys)
+        order = np.argsort(keys)
+        policy = (keys[order], np.concatenate(policy_actions)[order])
+    return values[0], policy
+
+def exploitability(strategy, fit_deals=2000, eval_deals=2000, seed=0, tree=None, abstraction="buckets"):
+    """Sampled best response exploitability of an abstract strategy, in mbb/hand.
+
+    For each seat a best response to strategy is fitted on fit_deals sampled deals
+    and then evaluated on eval_deals fresh ones. Exploitability is the mean of the two
+    best response values (big blind = 1000 mbb). abstraction is the card abstraction
+    the strategy was trained with.
+
+    The in-sample value ("exploitability_in_sample") is biased upwards: the best
+    response picks its actions knowing the sampled deals, so a key seen on few deals
+    acts as if it could see the opponent's cards and the board (clairvoyance bias).
+    The held-out value only credits actions chosen without seeing the evaluation deals,
+    so it is a lower estimate of the true abstract best response; the two bracket it
+    and converge as the deal counts grow.
+    """
+    tree = tree or PublicTree()
+    strategy = strategy_arrays(strategy)
+    fit = Deals(fit_deals, seed=seed, abstraction=abstraction)
+    evaluation = Deals(eval_deals, seed=seed + 1, abstraction=abstraction)
+    in_sample, held_out = [], []
+    for br_player in range(PLAYER_COUNT):
+        fit_values, policy = best_response(tree, strategy, fit, br_player)
+        eval_values, _ = best_response(tree, strategy, evaluation, br_player, policy=policy)
+        in_sample.append(fit_values.mean())
+        held_out.append(eval_values.mean())
+    to_mbb = 1000.0 / BIG_BLIND
+    return {
+        "exploitability": float(np.mean(held_out)) * to_mbb,
+        "exploitability_in_sample": float(np.mean(in_sample)) * to_mbb,
+        "best_response_values": [float(v) * to_mbb for v in held_out],
+        "fit_deals": fit_deals,
+        "eval_deals": eval_deals
+    }
+
+# python best_response.py <checkpoint dir | strategy .pkl | compiled .bin>, run from this directory
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sampled best response exploitability of an MCCFR strategy")
+    parser.add_argument("strategy")
+    parser.add_argument("--fit-deals", type=int, default=2000)
+    parser.add_argument("--eval-deals", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--abstraction", choices=CARD_ABSTRACTIONS, default="buckets")
+    args = parser.parse_args()
+    import os, pickle
+    from sub.mccfr.compiled_strategy import is_compiled_strategy_file
+    if os.path.isdir(args.strategy):
+        strategy = NodeTable.load_columns(args.strategy)[0]
+    elif is_compiled_strategy_file(args.strategy):
+        strategy = CompiledStrategy(args.strategy)
+    else:
+        with open(args.strategy, 'rb') as f:
+            strategy = pickle.load(f)
+    result = exploitability(strategy, fit_deals=args.fit_deals, eval_deals=args.eval_deals, seed=args.seed,
+                            abstraction=args.abstraction)
+    print(f"Exploitability: {result['exploitability']:.1f} mbb/hand (in-sample {result['exploitability_in_sample']:.1f}, "
+          f"{args.fit_deals} fit / {args.eval_deals} eval deals)")
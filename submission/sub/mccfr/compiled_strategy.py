@@ -0,0 +1,98 @@
+import os
+import pickle
+import argparse
+import numpy as np
+from sub.mccfr.mccfr_abstraction import parse_legacy_key
+
+# file layout: header, then the sorted int64 infoset keys, then one row of uint16
+# quantized probabilities (p * QUANT_SCALE) per key
+MAGIC = b"MCCFRSTR"
+VERSION = 1
+HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("num_actions", "<u4"), ("count", "<u8")])
+QUANT_SCALE = 65535
+
+DEFAULT_COMPILED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mccfr_strategy_10000.bin")
+
+_loaded = {}
+
+def compile_strategy(strategy, path, num_actions=3):
+    """Write an average strategy (key -> probabilities dict, or the path of its pickle) as a compiled file."""
+    if isinstance(strategy, str):
+        with open(strategy, 'rb') as f:
+            strategy = pickle.load(f)
+    items = sorted((parse_legacy_key(key) if isinstance(key, str) else int(key), probs)
+                   for key, probs in strategy.items())
+    keys = np.array([key for key, _ in items], dtype="<i8")
+    probs = np.zeros((len(items), num_actions), dtype="<u2")
+    for i, (_, row) in enumerate(items):
+        probs[i, :len(row)] = np.rint(np.clip(row[:num_actions], 0.0, 1.0) * QUANT_SCALE)
+    header = np.array([(MAGIC, VERSION, num_actions, len(keys))], dtype=HEADER)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(keys.tobytes())
+        f.write(probs.tobytes())
+    os.replace(tmp_path, path)
+    return len(keys)
+
+class CompiledStrategy:
+    """Read-only view of a compiled strategy file.
+
+    The arrays are memory-mapped, so the file is paged in on demand and shared by
+    every process that maps it. get looks a key up by binary search.
+    """
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC or header["version"][0] != VERSION:
+            raise ValueError("%s is not a compiled strategy file" % path)
+        self.path = path
+        self.num_actions = int(header["num_actions"][0])
+        count = int(header["count"][0])
+        self.keys = _map(path, "<i8", HEADER.itemsize, (count,))
+        self.probs = _map(path, "<u2", HEADER.itemsize + 8 * count, (count, self.num_actions))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def find(self, key):
+        keys = self.keys
+        idx = int(keys.searchsorted(np.int64(key)))
+        if idx < len(keys) and int(keys[idx]) == key:
+            return idx
+        return -1
+
+    def get(self, key, default=None):
+        idx = self.find(key)
+        if idx < 0:
+            return default
+        return [q / QUANT_SCALE for q in self.probs[idx].tolist()]
+
+def _map(path, dtype, offset, shape):
+    if shape[0] == 0: # an empty region can not be mapped
+        return np.zeros(shape, dtype=dtype)
+    # plain ndarray views of the mapping skip the memmap subclass overhead on every lookup
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape).view(np.ndarray)
+
+# one mapping per file and process, shared by every agent instance
+def load_compiled_strategy(path=DEFAULT_COMPILED_FILE):
+    path = os.path.abspath(path)
+    strategy = _loaded.get(path)
+    if strategy is None:
+        strategy = _loaded[path] = CompiledStrategy(path)
+    return strategy
+
+def is_compiled_strategy_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+# python -m sub.mccfr.compiled_strategy <strategy.pkl> [<output.bin>], run from submission/
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile an MCCFR average strategy pickle for MCCFRPlayer")
+    parser.add_argument("strategy", help="pickled key -> probabilities dict")
+    parser.add_argument("output", nargs="?", default=DEFAULT_COMPILED_FILE)
+    args = parser.parse_args()
+    count = compile_strategy(args.strategy, args.output)
+    print("Compiled %d infosets to %s (%d bytes)" % (count, args.output, os.path.getsize(args.output)))
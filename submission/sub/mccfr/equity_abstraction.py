@@ -0,0 +1,327 @@
+import os
+import json
+import argparse
+import multiprocessing
+import numpy as np
+from sub.mccfr.mccfr_abstraction import (RANKS, RANK_MAP, SUITS, STREETS, STREET_INDEX, HAND_BUCKETS, BOARD_BUCKETS,
+                                         RANK_PRIMES, EQUITY_BOARD_BUCKET, rank_multisets, load_bucket_tables,
+                                         get_hand_bucket_id, get_board_bucket_id, get_hole_bucket_id, get_card_key,
+                                         pack_infoset_key)
+
+# Equity distribution abstraction, built offline:
+#   1. cells: preflop the 169 canonical hole hands, postflop a canonical hole hand crossed with
+#      the hand bucket and board bucket of mccfr_abstraction (169 * 29 * 13 cells per street)
+#   2. a histogram of the river equity against a random hand, over random runouts, for sampled
+#      deals of every street, summed per cell (worker processes each sample part of the deals)
+#   3. k-medians of the cells' cumulative histograms under the L1 distance, which is the earth
+#      mover's distance between 1-d histograms, weighted by how often a cell is dealt
+#   4. tables cell -> cluster, clusters numbered by increasing mean equity
+# Keys of this abstraction carry the preflop cluster in the hole bucket field, the street's
+# cluster in the hand bucket field and EQUITY_BOARD_BUCKET in the board field.
+EQUITY_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "equity_tables")
+HISTOGRAM_BINS = 20
+MAX_PREFLOP_CLUSTERS = 16 # width of the hole bucket field
+MAX_POSTFLOP_CLUSTERS = 32 # width of the hand bucket field
+BOARD_SIZES = [0, 3, 4, 5]
+HOLE_CLASSES = len(RANKS) * len(RANKS)
+CELLS = HOLE_CLASSES * len(HAND_BUCKETS) * len(BOARD_BUCKETS)
+MAX_OPPONENTS = (52 - 7) // 2
+
+# ------ vectorized 7 card evaluation -------
+# hand value = category * 13^5 + up to five ranks, base 13 (standard hold'em ranking)
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+
+def _value(category, ranks):
+    value = category
+    for i in range(5):
+        value = value * 13 + (ranks[i] if i < len(ranks) else 0)
+    return value
+
+def _straight_high(rank_set):
+    for high in range(12, 2, -1):
+        if all((r if r >= 0 else 12) in rank_set for r in range(high - 4, high + 1)):
+            return high
+    return -1
+
+# best hand without flushes, of a multiset of 7 ranks
+def _rank_value(ranks):
+    counts = [ranks.count(r) for r in range(13)]
+    by_count = sorted(range(13), key=lambda r: (counts[r], r), reverse=True)
+    top = by_count[0]
+    singles = sorted((r for r in range(13) if counts[r] > 0), reverse=True)
+    if counts[top] == 4:
+        return _value(QUADS, [top, max(r for r in singles if r != top)])
+    if counts[top] == 3 and counts[by_count[1]] >= 2:
+        return _value(FULL_HOUSE, [top, by_count[1]])
+    straight = _straight_high(set(ranks))
+    if straight >= 0:
+        return _value(STRAIGHT, [straight])
+    if counts[top] == 3:
+        return _value(TRIPS, [top] + [r for r in singles if r != top][:2])
+    if counts[top] == 2 and counts[by_count[1]] == 2:
+        pairs = [top, by_count[1]]
+        return _value(TWO_PAIR, pairs + [r for r in singles if r not in pairs][:1])
+    if counts[top] == 2:
+        return _value(PAIR, [top] + [r for r in singles if r != top][:3])
+    return _value(HIGH_CARD, singles[:5])
+
+# best hand of the cards of the flush suit, as a 13 bit rank mask with at least 5 bits
+def _flush_value(mask):
+    ranks = [r for r in range(12, -1, -1) if mask >> r & 1]
+    straight = _straight_high(set(ranks))
+    if straight >= 0:
+        return _value(STRAIGHT_FLUSH, [straight])
+    return _value(FLUSH, ranks[:5])
+
+_evaluator = []
+
+# sorted prime products of the 7 rank multisets with their values, and flush values per rank mask
+def _evaluator_tables():
+    if not _evaluator:
+        multisets = rank_multisets(7)
+        products = np.array([np.prod([RANK_PRIMES[r] for r in ranks], dtype=np.int64) for ranks in multisets])
+        values = np.array([_rank_value(list(ranks)) for ranks in multisets], dtype=np.int64)
+        order = np.argsort(products)
+        flush_values = np.zeros(1 << 13, dtype=np.int64)
+        for mask in range(1 << 13):
+            if bin(mask).count("1") >= 5:
+                flush_values[mask] = _flush_value(mask)
+        _evaluator.extend([products[order], values[order], flush_values])
+    return _evaluator
+
+def hand_values(cards):
+    """Hand values of (..., 7) arrays of monte_carlo card ints (rank c // 4, suit c % 4); higher wins."""
+    products, values, flush_values = _evaluator_tables()
+    ranks, suits = cards // 4, cards % 4
+    primes = np.array(RANK_PRIMES, dtype=np.int64)
+    value = values[products.searchsorted(primes[ranks].prod(axis=-1))]
+    suit_counts = (suits[..., None] == np.arange(4)).sum(axis=-2)
+    flush_suit = suit_counts.argmax(axis=-1)
+    has_flush = suit_counts.max(axis=-1) >= 5
+    if has_flush.any():
+        # ranks are distinct within a suit, so the bits can be summed
+        mask = ((suits == flush_suit[..., None]) << ranks).sum(axis=-1)
+        value = np.where(has_flush, np.maximum(value, flush_values[mask]), value)
+    return value
+
+# ------ cells -------
+# canonical hole hand: higher * 13 + lower if suited, lower * 13 + higher otherwise (pairs on the diagonal)
+def hole_class(hole_cards):
+    rank1, rank2 = RANK_MAP[hole_cards[0][0].upper()], RANK_MAP[hole_cards[1][0].upper()]
+    high, low = max(rank1, rank2), min(rank1, rank2)
+    if hole_cards[0][1].lower() == hole_cards[1][1].lower():
+        return high * 13 + low
+    return low * 13 + high
+
+def _hole_classes(hole):
+    ranks, suits = hole // 4, hole % 4
+    high, low = ranks.max(axis=-1), ranks.min(axis=-1)
+    return np.where(suits[..., 0] == suits[..., 1], high * 13 + low, low * 13 + high)
+
+# the bucket tables of mccfr_abstraction, vectorized
+def _bucket_ids(cards, products, buckets, min_count):
+    primes = np.array(RANK_PRIMES, dtype=np.int64)
+    max_suit = (cards[..., None] % 4 == np.arange(4)).sum(axis=-2).max(axis=-1)
+    column = np.clip(max_suit, min_count, min_count + buckets.shape[1] - 1) - min_count
+    return buckets[products.searchsorted(primes[cards // 4].prod(axis=-1)), column].astype(np.int64)
+
+def _cells(street, hole, board):
+    classes = _hole_classes(hole)
+    if street == 0:
+        return classes
+    hand_products, hand_buckets, board_products, board_buckets = load_bucket_tables()
+    hand = _bucket_ids(np.concatenate([hole, board], axis=-1), hand_products, hand_buckets, 3)
+    texture = _bucket_ids(board, board_products, board_buckets, 2)
+    return (classes * len(HAND_BUCKETS) + hand) * len(BOARD_BUCKETS) + texture
+
+# ------ equity histograms -------
+def _sample_histograms(task):
+    """Histogram sums and deal counts per cell of one street, from one worker's share of the deals."""
+    street, deals, rollouts, opponents, seed, chunk = task
+    rng = np.random.default_rng(seed)
+    known = 2 + BOARD_SIZES[street]
+    cell_num = HOLE_CLASSES if street == 0 else CELLS
+    sums = np.zeros((cell_num, HISTOGRAM_BINS))
+    counts = np.zeros(cell_num)
+    for start in range(0, deals, chunk):
+        deal_num = min(chunk, deals - start)
+        dealt = np.argsort(rng.random((deal_num, 52)), axis=1)[:, :known]
+        # every rollout completes the board and deals the opponents from the unseen cards
+        keys = rng.random((deal_num, rollouts, 52))
+        keys[np.arange(deal_num)[:, None, None], np.arange(rollouts)[None, :, None], dealt[:, None, :]] = 2.0
+        drawn = np.argsort(keys, axis=2)[:, :, :5 - BOARD_SIZES[street] + 2 * opponents]
+        board = np.concatenate([np.broadcast_to(dealt[:, None, 2:], (deal_num, rollouts, known - 2)),
+                                drawn[:, :, :5 - BOARD_SIZES[street]]], axis=2)
+        hole = np.broadcast_to(dealt[:, None, :2], (deal_num, rollouts, 2))
+        hero = hand_values(np.concatenate([hole, board], axis=2))
+        opponent_hole = drawn[:, :, 5 - BOARD_SIZES[street]:].reshape(deal_num, rollouts, opponents, 2)
+        villain = hand_values(np.concatenate([opponent_hole, np.broadcast_to(board[:, :, None, :], (deal_num, rollouts, opponents, 5))], axis=3))
+        equity = ((hero[..., None] > villain) + 0.5 * (hero[..., None] == villain)).mean(axis=2)
+        if street == 3: # the board is complete, the rollouts only deal other opponents
+            equity = np.broadcast_to(equity.mean(axis=1, keepdims=True), equity.shape)
+        bins = np.minimum((equity * HISTOGRAM_BINS).astype(np.int64), HISTOGRAM_BINS - 1)
+        histograms = (bins[..., None] == np.arange(HISTOGRAM_BINS)).mean(axis=1)
+        cells = _cells(street, dealt[:, :2], dealt[:, 2:])
+        np.add.at(sums, cells, histograms)
+        np.add.at(counts, cells, 1)
+    return street, sums, counts
+
+# ------ clustering -------
+def _l1(cdfs, centers):
+    return np.abs(cdfs[:, None, :] - centers[None, :, :]).sum(axis=2)
+
+def _weighted_median(values, weights):
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    cumulative = np.cumsum(weights[order], axis=0)
+    idx = (cumulative < cumulative[-1:] / 2).sum(axis=0)
+    return sorted_values[idx, np.arange(values.shape[1])]
+
+def cluster_histograms(histograms, weights, clusters, iterations=30, seed=0):
+    """k-medians of histograms under the earth mover's distance (L1 between the cumulative
+    histograms), weighted, with k-means++ seeding. Returns (assignment, centers as cumulative
+    histograms), clusters ordered by increasing mean of their center."""
+    rng = np.random.default_rng(seed)
+    cdfs = np.cumsum(histograms, axis=1)
+    weights = np.asarray(weights, dtype=float)
+    clusters = min(clusters, int((weights > 0).sum()))
+    centers = cdfs[[rng.choice(len(cdfs), p=weights / weights.sum())]]
+    while len(centers) < clusters:
+        distance = _l1(cdfs, centers).min(axis=1) * weights
+        centers = np.vstack([centers, cdfs[rng.choice(len(cdfs), p=distance / distance.sum())]])
+    for _ in range(iterations):
+        assignment = _l1(cdfs, centers).argmin(axis=1)
+        new_centers = centers.copy()
+        for k in range(clusters):
+            members = (assignment == k) & (weights > 0)
+            if members.any():
+                new_centers[k] = _weighted_median(cdfs[members], weights[members])
+        if np.array_equal(new_centers, centers):
+            break
+        centers = new_centers
+    # a larger cumulative histogram is a lower mean equity
+    centers = centers[np.argsort(-centers.sum(axis=1))]
+    return _l1(cdfs, centers).argmin(axis=1), centers
+
+# cells without samples take the histogram pooled over the hole hands of their hand and board
+# bucket, or of their hand bucket only
+def _fill_unseen(sums, counts):
+    histograms = sums / np.maximum(counts, 1)[:, None]
+    shape = (HOLE_CLASSES, len(HAND_BUCKETS), len(BOARD_BUCKETS), HISTOGRAM_BINS)
+    for axes in [(0,), (0, 2)]:
+        pooled_sums = sums.reshape(shape).sum(axis=axes, keepdims=True)
+        pooled_counts = counts.reshape(shape[:3]).sum(axis=axes, keepdims=True)
+        pooled = np.broadcast_to(pooled_sums / np.maximum(pooled_counts, 1)[..., None], shape).reshape(sums.shape)
+        pooled_seen = np.broadcast_to(pooled_counts, shape[:3]).reshape(counts.shape) > 0
+        unseen = (histograms.sum(axis=1) == 0) & pooled_seen
+        histograms[unseen] = pooled[unseen]
+    return histograms
+
+def build_equity_tables(path=EQUITY_TABLE_DIR, preflop_clusters=8, postflop_clusters=16, deals=(20000, 100000, 100000, 100000),
+                        rollouts=16, opponents=8, workers=None, seed=0, chunk=500):
+    """Sample the equity histograms in a process pool, cluster them and write the tables."""
+    if not 0 < preflop_clusters <= MAX_PREFLOP_CLUSTERS or not 0 < postflop_clusters <= MAX_POSTFLOP_CLUSTERS:
+        raise ValueError(f"At most {MAX_PREFLOP_CLUSTERS} preflop and {MAX_POSTFLOP_CLUSTERS} postflop clusters fit in a key")
+    if not 0 < opponents <= MAX_OPPONENTS:
+        raise ValueError(f"Between 1 and {MAX_OPPONENTS} opponents per rollout")
+    workers = workers or os.cpu_count() or 1
+    tasks = [(street, deals[street] // workers + (w < deals[street] % workers), rollouts, opponents,
+              [seed, street, w], chunk) for street in range(len(STREETS)) for w in range(workers)]
+    sums = [0] * len(STREETS)
+    counts = [0] * len(STREETS)
+    with multiprocessing.Pool(workers) as pool:
+        for street, street_sums, street_counts in pool.imap_unordered(_sample_histograms, tasks):
+            sums[street] = sums[street] + street_sums
+            counts[street] = counts[street] + street_counts
+    os.makedirs(path, exist_ok=True)
+    for street, name in enumerate(STREETS):
+        if street == 0:
+            histograms = sums[0] / np.maximum(counts[0], 1)[:, None]
+            clusters = preflop_clusters
+        else:
+            histograms = _fill_unseen(sums[street], counts[street])
+            clusters = postflop_clusters
+        # hole classes are weighted by how often they are dealt, cells by how often they were sampled
+        weights = counts[street] + (histograms.sum(axis=1) > 0) * 1e-3
+        assignment, _ = cluster_histograms(histograms, weights, clusters, seed=seed)
+        np.save(os.path.join(path, name + "_buckets.npy"), assignment.astype(np.uint8))
+    with open(os.path.join(path, "manifest.json"), 'w') as f:
+        json.dump({"preflop_clusters": preflop_clusters, "postflop_clusters": postflop_clusters, "deals": list(deals),
+                   "rollouts": rollouts, "opponents": opponents, "bins": HISTOGRAM_BINS, "seed": seed}, f)
+    _equity_tables.pop(path, None)
+    return path
+
+# ------ lookup -------
+_equity_tables = {}
+
+def load_equity_tables(path=EQUITY_TABLE_DIR):
+    if path not in _equity_tables:
+        _equity_tables[path] = [np.load(os.path.join(path, name + "_buckets.npy"), mmap_mode='r').view(np.ndarray)
+                                for name in STREETS]
+    return _equity_tables[path]
+
+# canonical class of the hole cards, keyed by the card strings in both orders
+HOLE_CLASS_TABLE = {}
+for _card1 in [r + s for r in RANKS for s in SUITS]:
+    for _card2 in [r + s for r in RANKS for s in SUITS]:
+        if _card1 != _card2:
+            HOLE_CLASS_TABLE[(_card1, _card2)] = hole_class([_card1, _card2])
+
+def get_equity_card_key(street, hole_card_str_list, community_card_str_list, path=EQUITY_TABLE_DIR):
+    """Card part of an infoset key (see mccfr_abstraction.get_card_key) in the equity abstraction."""
+    tables = load_equity_tables(path)
+    cls = HOLE_CLASS_TABLE.get((hole_card_str_list[0], hole_card_str_list[1]))
+    if cls is None: # other capitalization
+        cls = hole_class(hole_card_str_list)
+    street_id = STREET_INDEX[street]
+    cluster = 0
+    if street_id > 0:
+        hand = get_hand_bucket_id(hole_card_str_list, community_card_str_list)
+        cell = (cls * len(HAND_BUCKETS) + hand) * len(BOARD_BUCKETS) + get_board_bucket_id(community_card_str_list)
+        cluster = int(tables[street_id][cell])
+    return pack_infoset_key(street_id, int(tables[0][cls]), cluster, EQUITY_BOARD_BUCKET, 0, 0)
+
+# card strings and hole bucket ids of monte_carlo card ints
+CARD_STRS = [RANKS[c // 4] + SUITS[c % 4] for c in range(52)]
+HOLE_BUCKET_IDS = np.array([[get_hole_bucket_id([card1, card2]) if card1 != card2 else 0 for card2 in CARD_STRS]
+                            for card1 in CARD_STRS], dtype=np.int64)
+
+def get_card_keys(street, hole, board, abstraction="buckets"):
+    """mccfr_abstraction.get_card_key of many hole card pairs on one board, in either card
+    abstraction. hole is an (n x 2) array and board a list of monte_carlo card ints (only the
+    cards of street are used); returns an int64 array of n keys."""
+    street_id = STREET_INDEX[street]
+    hole = np.asarray(hole, dtype=np.int64).reshape(-1, 2)
+    board = np.asarray(board, dtype=np.int64)[:BOARD_SIZES[street_id]]
+    if street_id > 0 and load_bucket_tables() is None: # one key at a time
+        board_strs = [CARD_STRS[c] for c in board]
+        return np.array([get_card_key(street, [CARD_STRS[c] for c in pair], board_strs, abstraction)
+                         for pair in hole.tolist()], dtype=np.int64)
+    full_board = np.broadcast_to(board, (len(hole), len(board)))
+    if abstraction == "equity":
+        tables = load_equity_tables()
+        clusters = tables[street_id][_cells(street_id, hole, full_board)].astype(np.int64) if street_id > 0 else 0
+        return pack_infoset_key(street_id, tables[0][_hole_classes(hole)].astype(np.int64), clusters, EQUITY_BOARD_BUCKET, 0, 0)
+    hole_buckets = HOLE_BUCKET_IDS[hole[:, 0], hole[:, 1]]
+    if street_id == 0:
+        return pack_infoset_key(street_id, hole_buckets, 0, 0, 0, 0)
+    hand_products, hand_buckets, board_products, board_buckets = load_bucket_tables()
+    hand = _bucket_ids(np.concatenate([hole, full_board], axis=1), hand_products, hand_buckets, 3)
+    texture = int(_bucket_ids(board, board_products, board_buckets, 2))
+    return pack_infoset_key(street_id, hole_buckets, hand, texture, 0, 0)
+
+# python -m sub.mccfr.equity_abstraction [options], run from submission/
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the equity distribution abstraction tables")
+    parser.add_argument("--output", default=EQUITY_TABLE_DIR)
+    parser.add_argument("--preflop-clusters", type=int, default=8)
+    parser.add_argument("--postflop-clusters", type=int, default=16)
+    parser.add_argument("--deals", type=int, nargs=4, default=[20000, 100000, 100000, 100000], help="sampled deals per street")
+    parser.add_argument("--rollouts", type=int, default=16)
+    parser.add_argument("--opponents", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print("Equity tables written to %s" % build_equity_tables(args.output, args.preflop_clusters, args.postflop_clusters,
+                                                               tuple(args.deals), args.rollouts, args.opponents,
+                                                               args.workers, args.seed))
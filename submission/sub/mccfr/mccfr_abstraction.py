@@ -1,4 +1,9 @@
+import os
+import argparse
+import itertools
 import collections
+import multiprocessing
+import numpy as np
 
 SUITS = "shdc"
 RANKS = "23456789TJQKA"
@@ -62,17 +67,14 @@ def get_preflop_bucket(hole_cards):
 def get_postflop_bucket(hole_list, community_list):
     all_cards = hole_list + community_list
     ranks = [RANK_MAP[c[0].upper()] for c in all_cards]
-    suits = [c[1].lower() for c in all_cards]
-
+    suit_counts = collections.Counter(c[1].lower() for c in all_cards)
+    return postflop_bucket_from_ranks(ranks, max(suit_counts.values(), default=0))
 
+# the bucket only depends on the ranks and on the size of the largest suit, which is what
+# the lookup tables are indexed by
+def postflop_bucket_from_ranks(ranks, max_suit_count):
     # flush check
-    suit_counts = collections.Counter(suits)
-    flush_suit = None
-    for s, count in suit_counts.items():
-        if count >= 5:
-            flush_suit = s
-            break
-    is_flush = (flush_suit is not None)
+    is_flush = max_suit_count >= 5
 
     # striaght check
     unique_ranks = sorted(list(set(ranks)))
@@ -86,8 +88,6 @@ def get_postflop_bucket(hole_list, community_list):
         if potential_straight.issubset(ranks_for_straight_check_set):
             is_straight = True
 
- 
-
     # pairs, trips, quads, FH
     rank_counts = collections.Counter(ranks)
     counts = sorted(rank_counts.values(), reverse=True)
@@ -128,10 +128,7 @@ def get_postflop_bucket(hole_list, community_list):
 
     if not is_flush and not is_straight and strength_bucket != "St:Monster":
         # flush draw
-        for s, count in suit_counts.items():
-            if count == 4:
-                flush_draw = True
-                break
+        flush_draw = max_suit_count == 4
 
         # straight draws 
         unique_ranks_for_draw = sorted(list(ranks_for_straight_check_set))
@@ -164,9 +161,11 @@ def get_postflop_bucket(hole_list, community_list):
 # different types of community cards, consider how likely we can make soemthing vs opponent making something
 def get_board_texture_bucket(community_card_str_list):
     board = community_card_str_list
+    suit_counts = collections.Counter(c[1].lower() for c in board)
+    return board_bucket_from_ranks([RANK_MAP[c[0].upper()] for c in board], max(suit_counts.values(), default=0))
 
-    ranks = sorted([RANK_MAP[c[0].upper()] for c in board])
-    suits = [c[1].lower() for c in board]
+def board_bucket_from_ranks(ranks, max_suit_count):
+    ranks = sorted(ranks)
 
     # board is paired or has trips
     rank_counts = collections.Counter(ranks)
@@ -180,10 +179,7 @@ def get_board_texture_bucket(community_card_str_list):
         is_paired = True
 
     # board can have a flush
-    suit_counts = collections.Counter(suits)
-    flush_possible = False
-    if any(count >= 3 for count in suit_counts.values()):
-         flush_possible = True
+    flush_possible = max_suit_count >= 3
 
     # connectedness of board
     is_connected = False
@@ -223,19 +219,218 @@ def get_board_texture_bucket(community_card_str_list):
     return f"Board:{texture}"
 
 
-def get_infoset_key(street, hole_card_str_list, community_card_str_list, betting_history, num_raises_street):
-    hole_bucket = get_preflop_bucket(hole_card_str_list)
-
+# infoset keys are packed into one int:
+#   street (2 bits) | hole bucket (4) | hand bucket (5) | board bucket (4) | raises (4) | history
+# the history takes the remaining bits, one base 4 digit per action (f=1, c=2, r=3)
+STREETS = ["preflop", "flop", "turn", "river"]
+PREFLOP_BUCKETS = ["P:HIGH", "P:MED", "P:LOW",
+                   "S:HIGH_CONN", "S:CONN", "S:HIGH", "S:LOW",
+                   "U:HIGH_CONN", "U:CONN", "U:HIGH", "U:LOW"]
+STRENGTH_BUCKETS = ["St:HighCard", "St:Pair", "St:TwoPair", "St:Trips", "St:Straight", "St:Flush", "St:Monster"]
+DRAW_BUCKETS = ["D:None", "D:Flush", "D:OESD", "D:Gutshot"]
+HAND_BUCKETS = ["Hand:Preflop"] + [f"{strength}|{draw}" for strength in STRENGTH_BUCKETS for draw in DRAW_BUCKETS]
+BOARD_BUCKETS = ["Board:None"] + [f"Board:{paired}_{flush}_{conn}"
+                                  for paired in ["Unpaired", "Paired", "Trips"]
+                                  for flush in ["Rainbow", "Flushy"]
+                                  for conn in ["Uncon", "Conn"]]
+HISTORY_CODES = {'f': 1, 'c': 2, 'r': 3}
+
+STREET_INDEX = {street: i for i, street in enumerate(STREETS)}
+PREFLOP_BUCKET_INDEX = {bucket: i for i, bucket in enumerate(PREFLOP_BUCKETS)}
+HAND_BUCKET_INDEX = {bucket: i for i, bucket in enumerate(HAND_BUCKETS)}
+BOARD_BUCKET_INDEX = {bucket: i for i, bucket in enumerate(BOARD_BUCKETS)}
+
+HOLE_SHIFT, HAND_SHIFT, BOARD_SHIFT, RAISE_SHIFT, HISTORY_SHIFT = 2, 6, 11, 15, 19
+# board field of equity abstraction keys (equity_abstraction), whose hole and hand fields are clusters
+EQUITY_BOARD_BUCKET = 0xf
+MAX_HISTORY_LEN = (63 - HISTORY_SHIFT) // 2 # keeps keys in int64
+
+# hole bucket id of each of the 1326 combos, keyed by the card strings in both orders
+PREFLOP_BUCKET_TABLE = {}
+for _card1 in [r + s for r in RANKS for s in SUITS]:
+    for _card2 in [r + s for r in RANKS for s in SUITS]:
+        if _card1 != _card2:
+            PREFLOP_BUCKET_TABLE[(_card1, _card2)] = PREFLOP_BUCKET_INDEX[get_preflop_bucket([_card1, _card2])]
+
+def get_hole_bucket_id(hole_cards):
+    bucket = PREFLOP_BUCKET_TABLE.get((hole_cards[0], hole_cards[1]))
+    if bucket is None: # other capitalization
+        bucket = PREFLOP_BUCKET_INDEX[get_preflop_bucket(hole_cards)]
+    return bucket
+
+def encode_history(betting_history):
+    code = 0
+    for action in betting_history:
+        code = code * 4 + HISTORY_CODES[action]
+    return code
+
+def decode_history(code):
+    history = []
+    while code:
+        history.append("_fcr"[code % 4])
+        code //= 4
+    return "".join(reversed(history))
+
+def pack_infoset_key(street_id, hole_bucket, hand_bucket, board_bucket, num_raises_street, history_code):
+    return (street_id | hole_bucket << HOLE_SHIFT | hand_bucket << HAND_SHIFT | board_bucket << BOARD_SHIFT
+            | num_raises_street << RAISE_SHIFT | history_code << HISTORY_SHIFT)
+
+def unpack_infoset_key(key):
+    if key >> BOARD_SHIFT & 0xf == EQUITY_BOARD_BUCKET:
+        return {
+            "street": STREETS[key & 0x3],
+            "hole_bucket": f"E{key >> HOLE_SHIFT & 0xf}",
+            "hand_bucket": f"E{key >> HAND_SHIFT & 0x1f}",
+            "board_bucket": "Board:Equity",
+            "num_raises_street": key >> RAISE_SHIFT & 0xf,
+            "betting_history": decode_history(key >> HISTORY_SHIFT)
+        }
+    return {
+        "street": STREETS[key & 0x3],
+        "hole_bucket": PREFLOP_BUCKETS[key >> HOLE_SHIFT & 0xf],
+        "hand_bucket": HAND_BUCKETS[key >> HAND_SHIFT & 0x1f],
+        "board_bucket": BOARD_BUCKETS[key >> BOARD_SHIFT & 0xf],
+        "num_raises_street": key >> RAISE_SHIFT & 0xf,
+        "betting_history": decode_history(key >> HISTORY_SHIFT)
+    }
+
+def get_infoset_key(street, hole_card_str_list, community_card_str_list, betting_history, num_raises_street, abstraction="buckets"):
+    return (get_card_key(street, hole_card_str_list, community_card_str_list, abstraction)
+            | get_betting_key(betting_history, num_raises_street))
+
+# card abstractions: the hand-made buckets below, or the equity clusters of equity_abstraction.
+# There is no process wide setting, whoever builds keys (trainer, GameState, agent) passes its own
+CARD_ABSTRACTIONS = ["buckets", "equity"]
+
+def check_card_abstraction(name):
+    if name not in CARD_ABSTRACTIONS:
+        raise ValueError(f"Unknown card abstraction {name}, expected one of {CARD_ABSTRACTIONS}")
+    if name == "equity":
+        from sub.mccfr.equity_abstraction import load_equity_tables
+        load_equity_tables() # fails here if the tables were not built
+
+# the card part of a key (street and buckets), constant for a player and street of a deal
+def get_card_key(street, hole_card_str_list, community_card_str_list, abstraction="buckets"):
+    if abstraction == "equity":
+        from sub.mccfr.equity_abstraction import get_equity_card_key
+        return get_equity_card_key(street, hole_card_str_list, community_card_str_list)
     if street == "preflop":
-        board_bucket = "Board:None"
-        hand_bucket = "Hand:Preflop"
+        hand_bucket = board_bucket = 0 # Hand:Preflop, Board:None
     else:
-        board_bucket = get_board_texture_bucket(community_card_str_list)
-        hand_bucket = get_postflop_bucket(hole_card_str_list, community_card_str_list)
-
-    history_str = "".join(betting_history)
-    raise_info = f"R{num_raises_street}"
-
-    key = f"{street}:{hole_bucket}:{hand_bucket}:{board_bucket}:{history_str}:{raise_info}"
-    # reduce infoset sizes
-    return key[:500]
+        board_bucket = get_board_bucket_id(community_card_str_list)
+        hand_bucket = get_hand_bucket_id(hole_card_str_list, community_card_str_list)
+    return pack_infoset_key(STREET_INDEX[street], get_hole_bucket_id(hole_card_str_list), hand_bucket, board_bucket, 0, 0)
+
+# the betting part of a key, ORed with the card part
+def get_betting_key(betting_history, num_raises_street):
+    if len(betting_history) > MAX_HISTORY_LEN:
+        betting_history = betting_history[-MAX_HISTORY_LEN:]
+    return min(num_raises_street, 0xf) << RAISE_SHIFT | encode_history(betting_history) << HISTORY_SHIFT
+
+# string key of the first strategy files and checkpoints, e.g.
+# "flop:U:CONN:St:TwoPair|D:None:Board:Paired_Rainbow_Uncon:r:R1"
+def parse_legacy_key(key):
+    parts = key.split(":")
+    return pack_infoset_key(
+        STREET_INDEX[parts[0]],
+        PREFLOP_BUCKET_INDEX[":".join(parts[1:3])],
+        HAND_BUCKET_INDEX[":".join(parts[3:-4])],
+        BOARD_BUCKET_INDEX[":".join(parts[-4:-2])],
+        int(parts[-1][1:]),
+        encode_history(parts[-2]))
+
+def format_infoset_key(key):
+    parts = unpack_infoset_key(key)
+    return (f"{parts['street']}:{parts['hole_bucket']}:{parts['hand_bucket']}:{parts['board_bucket']}:"
+            f"{parts['betting_history']}:R{parts['num_raises_street']}")
+
+# Lookup tables of the postflop hand and board texture buckets. Both only depend on the
+# multiset of ranks and on the size of the largest suit, so a table row is a rank multiset,
+# identified by the product of one prime per rank, and its columns are the suit classes:
+#   hand (5 to 7 cards)  max suit count <= 3, 4, >= 5
+#   board (3 to 5 cards) max suit count <= 2, >= 3
+# The products are sorted and looked up by binary search. The .npy files are memory-mapped,
+# rebuild them with python -m sub.mccfr.mccfr_abstraction after changing the bucket functions.
+RANK_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+HAND_SUIT_COUNTS = [3, 4, 5]
+BOARD_SUIT_COUNTS = [2, 3]
+BUCKET_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bucket_tables")
+
+# card string (any capitalization) -> (rank prime, suit index)
+CARD_PRIME_SUIT = {}
+for _r in RANKS:
+    for _s in SUITS:
+        for _card in {_r + _s, _r.lower() + _s, _r + _s.upper(), _r.lower() + _s.upper()}:
+            CARD_PRIME_SUIT[_card] = (RANK_PRIMES[RANK_MAP[_r]], SUITS.index(_s))
+
+_bucket_tables = {}
+
+def load_bucket_tables(path=BUCKET_TABLE_DIR):
+    """(hand products, hand buckets, board products, board buckets), None if the files are missing."""
+    if path not in _bucket_tables:
+        try:
+            _bucket_tables[path] = tuple(np.load(os.path.join(path, name + ".npy"), mmap_mode='r').view(np.ndarray)
+                                         for name in ["hand_products", "hand_buckets", "board_products", "board_buckets"])
+        except FileNotFoundError:
+            _bucket_tables[path] = None
+    return _bucket_tables[path]
+
+def _prime_product(cards):
+    product, suit_counts = 1, [0, 0, 0, 0]
+    for card in cards:
+        prime, suit = CARD_PRIME_SUIT[card]
+        product *= prime
+        suit_counts[suit] += 1
+    return product, max(suit_counts)
+
+def get_hand_bucket_id(hole_list, community_list):
+    tables = load_bucket_tables()
+    if tables is None:
+        return HAND_BUCKET_INDEX[get_postflop_bucket(hole_list, community_list)]
+    product, max_suit_count = _prime_product(hole_list + community_list)
+    products = tables[0]
+    return int(tables[1][products.searchsorted(product), min(max(max_suit_count, 3), 5) - 3])
+
+def get_board_bucket_id(community_list):
+    tables = load_bucket_tables()
+    if tables is None:
+        return BOARD_BUCKET_INDEX[get_board_texture_bucket(community_list)]
+    product, max_suit_count = _prime_product(community_list)
+    products = tables[2]
+    return int(tables[3][products.searchsorted(product), min(max(max_suit_count, 2), 3) - 2])
+
+# every rank multiset of card_num cards (no rank more than 4 times)
+def rank_multisets(card_num):
+    return [ranks for ranks in itertools.combinations_with_replacement(range(len(RANKS)), card_num)
+            if max(collections.Counter(ranks).values()) <= 4]
+
+def _hand_rows(rank_sets):
+    return [[HAND_BUCKET_INDEX[postflop_bucket_from_ranks(list(ranks), count)] for count in HAND_SUIT_COUNTS]
+            for ranks in rank_sets]
+
+def _board_rows(rank_sets):
+    return [[BOARD_BUCKET_INDEX[board_bucket_from_ranks(list(ranks), count)] for count in BOARD_SUIT_COUNTS]
+            for ranks in rank_sets]
+
+def build_bucket_tables(path=BUCKET_TABLE_DIR, workers=None, chunk_size=2000):
+    """Evaluate the bucket functions on every rank multiset in a process pool and write the tables."""
+    os.makedirs(path, exist_ok=True)
+    with multiprocessing.Pool(workers) as pool:
+        for name, card_nums, rows in [("hand", [5, 6, 7], _hand_rows), ("board", [3, 4, 5], _board_rows)]:
+            rank_sets = [ranks for card_num in card_nums for ranks in rank_multisets(card_num)]
+            chunks = [rank_sets[i:i + chunk_size] for i in range(0, len(rank_sets), chunk_size)]
+            buckets = np.array([row for chunk in pool.map(rows, chunks) for row in chunk], dtype=np.uint8)
+            products = np.array([np.prod([RANK_PRIMES[r] for r in ranks], dtype=np.int64) for ranks in rank_sets], dtype=np.int64)
+            order = np.argsort(products)
+            np.save(os.path.join(path, name + "_products.npy"), products[order])
+            np.save(os.path.join(path, name + "_buckets.npy"), buckets[order])
+    _bucket_tables.pop(path, None)
+    return path
+
+# python -m sub.mccfr.mccfr_abstraction [--workers N], run from submission/
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the postflop and board bucket lookup tables")
+    parser.add_argument("--output", default=BUCKET_TABLE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    print("Bucket tables written to %s" % build_bucket_tables(args.output, args.workers))
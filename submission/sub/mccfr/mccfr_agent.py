@@ -1,10 +1,12 @@
 import pickle
 import random
 from pypokerengine.players import BasePokerPlayer
-from sub.mccfr.mccfr_abstraction import get_infoset_key
+from sub.mccfr.mccfr_abstraction import get_infoset_key, parse_legacy_key, check_card_abstraction
+from sub.mccfr.compiled_strategy import DEFAULT_COMPILED_FILE, load_compiled_strategy, is_compiled_strategy_file
 
 
-DEFAULT_STRATEGY_FILE = "sub/mccfr/mccfr_checkpoint_10000_converted_avg.pkl"
+# compiled from mccfr_checkpoint_10000_converted_avg.pkl with sub.mccfr.compiled_strategy
+DEFAULT_STRATEGY_FILE = DEFAULT_COMPILED_FILE
 INTERNAL_ACTION_MAP = { 0: "fold", 1: "call", 2: "raise" }
 ACTION_MAP = {
     "fold": 'f', "call": 'c', "check": 'c', "raise": 'r',
@@ -12,10 +14,20 @@ ACTION_MAP = {
 }
 
 class MCCFRPlayer(BasePokerPlayer):
-    def __init__(self, strategy_file=DEFAULT_STRATEGY_FILE):
+    # abstraction must be the card abstraction the strategy was trained with (mccfr_abstraction.CARD_ABSTRACTIONS)
+    def __init__(self, strategy_file=DEFAULT_STRATEGY_FILE, abstraction="buckets"):
+        check_card_abstraction(abstraction)
+        self.abstraction = abstraction
         self.strategy_map = None
+        if is_compiled_strategy_file(strategy_file):
+            self.strategy_map = load_compiled_strategy(strategy_file)
+            return
         with open(strategy_file, 'rb') as f:
             self.strategy_map = pickle.load(f)
+        # strategy files written before the packed int keys use string keys
+        if any(isinstance(key, str) for key in self.strategy_map):
+            self.strategy_map = {parse_legacy_key(key) if isinstance(key, str) else key: probs
+                                 for key, probs in self.strategy_map.items()}
 
     def format_card(self, card):
         suit_in = card[0].lower()
@@ -51,7 +63,8 @@ class MCCFRPlayer(BasePokerPlayer):
             hole_card_str_list=hole_card_abstraction,
             community_card_str_list=community_cards_abstraction,
             betting_history=betting_history,
-            num_raises_street=num_raises
+            num_raises_street=num_raises,
+            abstraction=self.abstraction
         )
 
         action_probabilities = None
@@ -79,6 +92,8 @@ class MCCFRPlayer(BasePokerPlayer):
                     filtered_probs.append(0.0)
 
             total_prob = sum(filtered_probs)
+            if total_prob <= 0:
+                return self.fallback(valid_actions)
 
             final_probs = [p / total_prob for p in filtered_probs]
             action_indices = list(range(len(INTERNAL_ACTION_MAP)))
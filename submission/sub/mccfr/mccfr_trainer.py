@@ -1,23 +1,76 @@
 import pickle
-import copy
 import time
 import os
 import re
 import random
-from collections import defaultdict
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
 from monte_carlo import GameState, INTERNAL_ACTIONS, PLAYER_COUNT
+from node_table import NodeTable, SharedNodeTable
+from best_response import PublicTree, exploitability
+from sub.mccfr.mccfr_abstraction import parse_legacy_key, check_card_abstraction, CARD_ABSTRACTIONS
+from sub.telemetry import TelemetrySink, rss_bytes
 
-def create_default_node():
-    return {'regret_sum': [0.0] * len(INTERNAL_ACTIONS),
-            'strategy_sum': [0.0] * len(INTERNAL_ACTIONS)}
+# checkpoint directories, or the .npz / .pkl files of the earlier formats
+CHECKPOINT_FILENAME = r"mccfr_checkpoint_(\d+)(\.npz|\.pkl)?$"
+CHECKPOINT_FORMAT_RANK = {None: 2, ".npz": 1, ".pkl": 0}
 
-CHECKPOINT_FILENAME = r"mccfr_checkpoint_(\d+)\.pkl"
+# how regrets and strategy sums are accumulated, at iteration t:
+#   vanilla  regret += r,            strategy_sum += s
+#   cfr+     regret = max(regret + r, 0), strategy_sum += t * s  (regret matching+)
+#   linear   regret += t * r,        strategy_sum += t * s       (linear CFR)
+#   dcfr     regret += r, strategy_sum += s, then positive regrets are scaled by t^a / (t^a + 1),
+#            negative ones by t^b / (t^b + 1) and strategy sums by (t / (t + 1))^g (discounted CFR)
+UPDATE_RULES = ["vanilla", "cfr+", "linear", "dcfr"]
+DCFR_PARAMS = (1.5, 0.0, 2.0) # alpha, beta, gamma
+
+# external: every traverser action is expanded, opponent actions are sampled
+# outcome: a single trajectory per traversal, the traverser samples with exploration
+SAMPLING_SCHEMES = ["external", "outcome"]
+OUTCOME_EXPLORATION = 0.6
+
+# regret-based pruning: after prune_after iterations, prune_probability of the external
+# sampling iterations skip the traverser actions whose regret is below prune_threshold
+PRUNE_AFTER = 100
+PRUNE_PROBABILITY = 0.95
+
+# telemetry records: "progress" every log interval, "checkpoint" and "evaluation" (sampled best
+# response exploitability in mbb/hand, train(eval_deals=...)) at checkpoints
+TELEMETRY_FIELDS = ["time", "elapsed", "event", "iteration", "iterations_per_second", "nodes_per_second",
+                    "infosets", "rss_bytes", "regret_norm", "checkpoint_seconds", "eval_value"]
 
 class MCCFRTrainer:
-    def __init__(self, checkpoint_dir="mccfr_checkpoints"):
-        self.node_map = defaultdict(create_default_node)
+    def __init__(self, checkpoint_dir="mccfr_checkpoints", update_rule="vanilla", dcfr_params=DCFR_PARAMS,
+                 sampling="external", prune_threshold=None, prune_after=PRUNE_AFTER, prune_probability=PRUNE_PROBABILITY,
+                 telemetry=None, abstraction="buckets"):
+        if update_rule not in UPDATE_RULES:
+            raise ValueError(f"Unknown update rule {update_rule}, expected one of {UPDATE_RULES}")
+        if sampling not in SAMPLING_SCHEMES:
+            raise ValueError(f"Unknown sampling scheme {sampling}, expected one of {SAMPLING_SCHEMES}")
+        # every GameState of the trainer and its workers builds its keys with this abstraction
+        check_card_abstraction(abstraction)
+        self.abstraction = abstraction
+        self.node_table = NodeTable(num_actions=len(INTERNAL_ACTIONS))
         self.checkpoint_dir = checkpoint_dir
         self.start_iteration = 0
+        self.update_rule = update_rule
+        self.dcfr_params = dcfr_params
+        self.floor_regrets = update_rule == "cfr+"
+        self.regret_weight = 1.0
+        self.strategy_weight = 1.0
+        self.sampling = sampling
+        self.prune_threshold = prune_threshold
+        self.prune_after = prune_after
+        self.prune_probability = prune_probability
+        self.prune = False
+        # throughput per sampling scheme: iterations, decision nodes touched, pruned actions, seconds
+        self.counters = {scheme: {"iterations": 0, "nodes": 0, "pruned": 0, "seconds": 0.0} for scheme in SAMPLING_SCHEMES}
+        self.counter = self.counters[sampling]
+        self.last_checkpoint = None # base of the next delta checkpoint
+        self.telemetry = telemetry # TelemetrySink or None
 
         if not os.path.exists(self.checkpoint_dir):
             os.makedirs(self.checkpoint_dir)
@@ -26,13 +79,19 @@ class MCCFRTrainer:
     # ------checkpointing stuff---------
     def get_checkpoint(self):
         latest_iter = -1
+        latest_rank = -1
         latest_checkpoint_file = None
         for filename in os.listdir(self.checkpoint_dir):
             match = re.match(CHECKPOINT_FILENAME, filename)
             if match:
+                if match.group(2) is None and not os.path.exists(os.path.join(self.checkpoint_dir, filename, "manifest.json")):
+                    continue
                 iteration = int(match.group(1))
-                if iteration > latest_iter:
+                rank = CHECKPOINT_FORMAT_RANK[match.group(2)]
+                # prefer the newest format when several exist for an iteration
+                if iteration > latest_iter or (iteration == latest_iter and rank > latest_rank):
                     latest_iter = iteration
+                    latest_rank = rank
                     latest_checkpoint_file = filename
         if latest_checkpoint_file:
             return os.path.join(self.checkpoint_dir, latest_checkpoint_file), latest_iter
@@ -42,46 +101,72 @@ class MCCFRTrainer:
     def load_checkpoint(self):
         checkpoint_path, iteration = self.get_checkpoint()
         print(f"Latest checkpoint: {checkpoint_path} Iteration: {iteration}")
+        self.last_checkpoint = None
         if checkpoint_path and iteration >= 0:
-            with open(checkpoint_path, 'rb') as f:
-                checkpoint_data = pickle.load(f)
-                loaded_iteration = checkpoint_data['iteration']
-                new_node_map = defaultdict(create_default_node)
-                loaded_map_data = checkpoint_data['node_map']
-                for key, value in loaded_map_data.items():
-                    new_node_map[key] = value
-                self.node_map = new_node_map
-                self.start_iteration = loaded_iteration
+            if os.path.isdir(checkpoint_path):
+                self.node_table, manifest = NodeTable.load_columns(checkpoint_path)
+                self.start_iteration = manifest['iteration']
+                if manifest.get('update_rule', self.update_rule) != self.update_rule:
+                    print(f"Checkpoint was trained with {manifest['update_rule']}, continuing with {self.update_rule}")
+                if manifest.get('abstraction', "buckets") != self.abstraction:
+                    raise ValueError(f"Checkpoint {checkpoint_path} uses the {manifest.get('abstraction', 'buckets')} "
+                                     f"card abstraction, not {self.abstraction}")
+                self.last_checkpoint = os.path.basename(checkpoint_path)
+            elif checkpoint_path.endswith(".npz"):
+                self.node_table, extra = NodeTable.load(checkpoint_path)
+                self.start_iteration = int(extra['iteration'])
+            else: # legacy pickle of the node_map dicts
+                with open(checkpoint_path, 'rb') as f:
+                    checkpoint_data = pickle.load(f)
+                self.node_table = NodeTable.from_node_map(checkpoint_data['node_map'], len(INTERNAL_ACTIONS))
+                self.start_iteration = checkpoint_data['iteration']
+            # checkpoints from before the packed int infoset keys
+            if self.node_table.keys and isinstance(self.node_table.keys[0], str):
+                self.node_table.rekey(parse_legacy_key)
         else:
             print(f"No checkpoint, fresh run")
             self.start_iteration = 0
-            self.node_map = defaultdict(create_default_node)
-
-    def save_checkpoint(self, iteration):
-        checkpoint_filename = f"mccfr_checkpoint_{iteration}.pkl"
-        path = os.path.join(self.checkpoint_dir, checkpoint_filename)
-        node_map = dict(self.node_map)
-
-        checkpoint_data = {
-            'iteration': iteration,
-            'node_map': node_map
-        }
+            self.node_table = NodeTable(num_actions=len(INTERNAL_ACTIONS))
 
+    # delta checkpoints only hold the rows touched since the previous checkpoint
+    # and need it (and its own bases) to load
+    def save_checkpoint(self, iteration, delta=False):
+        checkpoint_name = f"mccfr_checkpoint_{iteration}"
+        path = os.path.join(self.checkpoint_dir, checkpoint_name)
         if not os.path.exists(self.checkpoint_dir):
             os.makedirs(self.checkpoint_dir)
-        with open(path, 'wb') as f:
-            pickle.dump(checkpoint_data, f)
+        base = self.last_checkpoint if delta and self.last_checkpoint != checkpoint_name else None
+        self.node_table.save_columns(path, iteration, base=base, update_rule=self.update_rule, abstraction=self.abstraction)
+        self.last_checkpoint = checkpoint_name
+
+    def is_delta_checkpoint(self, iteration, checkpoint_interval, full_checkpoint_every):
+        return (iteration // checkpoint_interval) % full_checkpoint_every != 0
+
+    # checkpoint plus its telemetry, and the exploitability of the average strategy if eval_deals
+    def checkpoint(self, iteration, delta=False, eval_deals=0):
+        start_time = time.time()
+        self.save_checkpoint(iteration, delta=delta)
+        self.record_telemetry("checkpoint", iteration, checkpoint_seconds=time.time() - start_time)
+        if eval_deals:
+            result = exploitability(self.node_table, eval_deals, eval_deals, abstraction=self.abstraction)
+            self.record_telemetry("evaluation", iteration, eval_value=result["exploitability"])
+
+    # called at log intervals only, the regret norm is the mean L2 norm of the regret rows
+    def record_telemetry(self, event, iteration, **values):
+        if self.telemetry is None:
+            return
+        regrets = self.node_table.regret_sum[:len(self.node_table)]
+        regret_norm = float(np.sqrt((regrets ** 2).sum(axis=1)).mean()) if len(regrets) else 0.0
+        self.telemetry.record(event, iteration=iteration, infosets=len(self.node_table), rss_bytes=rss_bytes(),
+                              regret_norm=regret_norm, **values)
   
     def save_final_strategy(self, total_iterations, f_name=None):
         if f_name is None:
             f_name = f"mccfr_strategy_avg_final_{total_iterations}.pkl"
         path = os.path.join(self.checkpoint_dir, f_name)
-        out_strat = {}
-        nodes_saved = 0
-        for key, _ in self.node_map.items():
-            avg_strat = self.get_average_strategy(key)
-            out_strat[key] = avg_strat
-            nodes_saved += 1
+        # same key -> [p_fold, p_call, p_raise] dict the agent loads
+        out_strat = dict(zip(self.node_table.keys, self.node_table.average_strategies().tolist()))
+        nodes_saved = len(out_strat)
         if not os.path.exists(self.checkpoint_dir):
             os.makedirs(self.checkpoint_dir)
         with open(path, 'wb') as f:
@@ -89,108 +174,338 @@ class MCCFRTrainer:
         print(f"Saved {nodes_saved} strategies to {path}")
 
     # ------ mccfr stuff -------
+    # strategies are arrays aligned with valid_actions
     def get_strategy(self, infoset_key, valid_actions):
-        node = self.node_map[infoset_key]
-        strategy = {a: 0.0 for a in valid_actions}
-        norm_sum = 0
-        for i in valid_actions:
-            if 0 <= i < len(node['regret_sum']):
-                regret = node['regret_sum'][i]
-                strategy[i] = max(0.0, regret)
-                norm_sum += strategy[i]
-        if norm_sum > 0:
-            for i in valid_actions:
-                 if i in strategy:
-                    strategy[i] /= norm_sum
-        else:
-            num_valid = len(valid_actions)
-            if num_valid > 0:
-                for i in valid_actions:
-                    strategy[i] = 1.0 / num_valid
-        return strategy
+        return self.node_table.strategy(self.node_table.row(infoset_key), valid_actions)
+
     def get_average_strategy(self, infoset_key):
-         node = self.node_map[infoset_key]
-         avg_strat = list(node['strategy_sum'])
-         norm_sum = sum(avg_strat)
-         if norm_sum > 0:
-            avg_strat = [s / norm_sum for s in avg_strat]
-         else:
-            avg_strat = [1.0 / len(INTERNAL_ACTIONS)] * len(INTERNAL_ACTIONS)
-         while len(avg_strat) < len(INTERNAL_ACTIONS):
-            avg_strat.append(0.0)
-         return avg_strat[:len(INTERNAL_ACTIONS)]
+        return self.node_table.average_strategy(infoset_key)
+
+    def begin_iteration(self, t):
+        self.regret_weight = float(t) if self.update_rule == "linear" else 1.0
+        self.strategy_weight = float(t) if self.update_rule in ("cfr+", "linear") else 1.0
+        self.counter = self.counters[self.sampling]
+        self.prune = self.prune_threshold is not None and self.sampling == "external" \
+            and t > self.prune_after and random.random() < self.prune_probability
+
+    # applies the discounts of iterations first..last at once (one iteration when sequential)
+    def end_iterations(self, first, last):
+        if self.update_rule != "dcfr":
+            return
+        alpha, beta, gamma = self.dcfr_params
+        t = np.arange(first, last + 1, dtype=float)
+        self.node_table.discount(np.prod(t ** alpha / (t ** alpha + 1)), np.prod(t ** beta / (t ** beta + 1)),
+                                 np.prod((t / (t + 1)) ** gamma))
+
+    def run_iteration(self, t):
+        start_time = time.time()
+        self.begin_iteration(t)
+        for p_id in range(PLAYER_COUNT):
+            self.traverse(GameState(self.abstraction), p_id)
+        self.end_iterations(t, t)
+        self.counter["iterations"] += 1
+        self.counter["seconds"] += time.time() - start_time
+
+    def traverse(self, game_state, player_id):
+        if game_state.is_terminal():
+            return 0.0
+        if self.sampling == "outcome":
+            return self.outcome_mccfr(game_state, player_id, [1.0] * PLAYER_COUNT, 1.0)[0]
+        return self.mccfr(game_state, player_id=player_id, reach_probs=[1.0] * PLAYER_COUNT)
+
+    def throughput(self):
+        stats = {}
+        for scheme, counter in self.counters.items():
+            if counter["iterations"] == 0:
+                continue
+            stats[scheme] = dict(counter,
+                                 iterations_per_second=counter["iterations"] / max(counter["seconds"], 1e-9),
+                                 nodes_per_second=counter["nodes"] / max(counter["seconds"], 1e-9),
+                                 nodes_per_iteration=counter["nodes"] / counter["iterations"])
+        return stats
 
     def mccfr(self, game_state, player_id, reach_probs):
         if game_state.is_terminal():
             return game_state.get_utility(player_id)
+        # the traversal runs in place on game_state: every change is undone before returning
         if game_state.is_chance_node():
-            next_game_state = game_state.advance_street()
-            if next_game_state.is_terminal():
-                return next_game_state.get_utility(player_id)
-            return self.mccfr(next_game_state, player_id, reach_probs)
+            game_state.advance_street()
+            if game_state.is_terminal():
+                util = game_state.get_utility(player_id)
+            else:
+                util = self.mccfr(game_state, player_id, reach_probs)
+            game_state.undo()
+            return util
         current_player = game_state.get_current_player()
         infoset_key = game_state.get_infoset_key_for_player(current_player)
         valid_actions = game_state.get_valid_actions()
         if not valid_actions:
-             if not game_state.is_terminal():
-                game_state.is_terminal_state = True
-             return game_state.get_utility(player_id)
-        strategy = self.get_strategy(infoset_key, valid_actions)
-        if not strategy and valid_actions:
-            num_valid = len(valid_actions)
-            strategy = {action: 1.0 / num_valid for action in valid_actions}
-        node = self.node_map[infoset_key]
+             token = game_state.mark()
+             game_state.is_terminal_state = True
+             util = game_state.get_utility(player_id)
+             game_state.undo(token)
+             return util
+        table = self.node_table
+        row = table.row(infoset_key)
+        strategy = table.strategy(row, valid_actions)
+        self.counter["nodes"] += 1
         if current_player == player_id:
-            action_utils = {a: 0.0 for a in valid_actions}
-            node_util = 0.0
-            for action in valid_actions:
-                next_gs = copy.deepcopy(game_state)
-                next_gs.apply_action(action)
+            explore = list(range(len(valid_actions)))
+            if self.prune:
+                # pruned actions count as zero utility and keep their regret
+                row_regrets = table.regret_sum[row].tolist()
+                explore = [i for i in explore if row_regrets[valid_actions[i]] >= self.prune_threshold] or explore
+                self.counter["pruned"] += len(valid_actions) - len(explore)
+            explored_actions = [valid_actions[i] for i in explore]
+            action_utils = np.zeros(len(valid_actions))
+            for i in explore:
+                token = game_state.apply_action(valid_actions[i])
                 action_rp = list(reach_probs)
-                action_utils[action] = self.mccfr(next_gs, player_id, action_rp)
-                prob = strategy.get(action, 0.0)
-                node_util += prob * action_utils[action]
+                action_utils[i] = self.mccfr(game_state, player_id, action_rp)
+                game_state.undo(token)
+            node_util = float(strategy.dot(action_utils))
             opp_reach = reach_probs[1 - player_id]
-            for action in valid_actions:
-                if 0 <= action < len(node['regret_sum']):
-                    node['regret_sum'][action] += opp_reach * (action_utils[action] - node_util)
+            regrets = table.regret_sum[row, explored_actions] + self.regret_weight * opp_reach * (action_utils[explore] - node_util)
+            if self.floor_regrets:
+                np.maximum(regrets, 0.0, out=regrets)
+            table.regret_sum[row, explored_actions] = regrets
             my_reach = reach_probs[player_id]
-            for action in valid_actions:
-                if 0 <= action < len(node['strategy_sum']):
-                    node['strategy_sum'][action] += my_reach * strategy.get(action, 0.0)
+            table.strategy_sum[row, valid_actions] += self.strategy_weight * my_reach * strategy
             return node_util
         else:
-            opp_strat = self.get_strategy(infoset_key, valid_actions)
-            if not opp_strat:
-                return 0.0
-            sampled_action = random.choices(list(opp_strat.keys()), weights=list(opp_strat.values()), k=1)[0]
+            opp_strat = strategy.tolist()
+            sampled_idx = random.choices(range(len(valid_actions)), weights=opp_strat, k=1)[0]
+            sampled_action = valid_actions[sampled_idx]
             my_reach = reach_probs[player_id]
-            for action in valid_actions:
-                if 0 <= action < len(node['strategy_sum']):
-                    node['strategy_sum'][action] += my_reach * opp_strat.get(action, 0.0)
-            next_gs = copy.deepcopy(game_state); next_gs.apply_action(sampled_action)
-            next_rp = list(reach_probs); sampled_prob = opp_strat.get(sampled_action, 0.0)
+            table.strategy_sum[row, valid_actions] += self.strategy_weight * my_reach * strategy
+            token = game_state.apply_action(sampled_action)
+            next_rp = list(reach_probs); sampled_prob = opp_strat[sampled_idx]
             next_rp[current_player] *= sampled_prob if sampled_prob > 0 else 0
-            return self.mccfr(next_gs, player_id, next_rp)
+            util = self.mccfr(game_state, player_id, next_rp)
+            game_state.undo(token)
+            return util
 
-    def train(self, target_i, checkpoint_interval=1000, log_interval=10):
+    # outcome sampling (Lanctot et al. 2009): returns the sampled utility divided by the
+    # probability of sampling the trajectory, and the tail reach of the current strategy
+    def outcome_mccfr(self, game_state, player_id, reach_probs, sample_prob):
+        if game_state.is_terminal():
+            return game_state.get_utility(player_id) / sample_prob, 1.0
+        if game_state.is_chance_node():
+            game_state.advance_street()
+            if game_state.is_terminal():
+                result = game_state.get_utility(player_id) / sample_prob, 1.0
+            else:
+                result = self.outcome_mccfr(game_state, player_id, reach_probs, sample_prob)
+            game_state.undo()
+            return result
+        current_player = game_state.get_current_player()
+        infoset_key = game_state.get_infoset_key_for_player(current_player)
+        valid_actions = game_state.get_valid_actions()
+        table = self.node_table
+        row = table.row(infoset_key)
+        strategy = table.strategy(row, valid_actions)
+        self.counter["nodes"] += 1
+        probs = strategy.tolist()
+        if current_player == player_id:
+            explore_prob = OUTCOME_EXPLORATION / len(valid_actions)
+            sample_probs = [explore_prob + (1.0 - OUTCOME_EXPLORATION) * p for p in probs]
+        else:
+            sample_probs = probs
+        sampled_idx = random.choices(range(len(valid_actions)), weights=sample_probs, k=1)[0]
+        next_rp = list(reach_probs)
+        next_rp[current_player] *= probs[sampled_idx]
+        token = game_state.apply_action(valid_actions[sampled_idx])
+        util, tail = self.outcome_mccfr(game_state, player_id, next_rp, sample_prob * sample_probs[sampled_idx])
+        game_state.undo(token)
+        if current_player == player_id:
+            weighted_util = util * reach_probs[1 - player_id]
+            regrets = np.full(len(valid_actions), -weighted_util * tail * probs[sampled_idx])
+            regrets[sampled_idx] = weighted_util * tail * (1.0 - probs[sampled_idx])
+            regrets = table.regret_sum[row, valid_actions] + self.regret_weight * regrets
+            if self.floor_regrets:
+                np.maximum(regrets, 0.0, out=regrets)
+            table.regret_sum[row, valid_actions] = regrets
+        else: # stochastically weighted averaging
+            table.strategy_sum[row, valid_actions] += self.strategy_weight * reach_probs[current_player] / sample_prob * strategy
+        return util, tail * probs[sampled_idx]
+
+    def train(self, target_i, checkpoint_interval=1000, log_interval=10, full_checkpoint_every=1, eval_deals=0):
         start_time = time.time()
         if self.start_iteration >= target_i:
             self.save_checkpoint(curr_i)
             return
+        # telemetry rates are over the iterations of the last log interval (checkpoints have their own
+        # records), the printed ones over the whole run
+        stats = self.counters[self.sampling]
+        last_log = (stats["seconds"], stats["iterations"], stats["nodes"])
         for i in range(self.start_iteration, target_i):
             curr_i = i + 1
-            for p_id in range(PLAYER_COUNT):
-                game_state = GameState()
-                if not game_state.is_terminal():
-                    self.mccfr(game_state, player_id=p_id, reach_probs=[1.0] * PLAYER_COUNT)
+            self.run_iteration(curr_i)
             if curr_i % checkpoint_interval == 0:
-                self.save_checkpoint(curr_i)
+                self.checkpoint(curr_i, delta=self.is_delta_checkpoint(curr_i, checkpoint_interval, full_checkpoint_every),
+                                eval_deals=eval_deals)
             if curr_i % log_interval == 0:
-                print(f"Iteration {curr_i}/{target_i} | Nodes: {len(self.node_map)} | Time: {time.time() - start_time}")
+                stats = self.throughput()[self.sampling]
+                print(f"Iteration {curr_i}/{target_i} | Nodes: {len(self.node_table)} | "
+                      f"Touched/it: {stats['nodes_per_iteration']:.0f} | It/s: {stats['iterations_per_second']:.1f} | Time: {time.time() - start_time}")
+                seconds = max(stats["seconds"] - last_log[0], 1e-9)
+                self.record_telemetry("progress", curr_i, iterations_per_second=(stats["iterations"] - last_log[1]) / seconds,
+                                      nodes_per_second=(stats["nodes"] - last_log[2]) / seconds)
+                last_log = (stats["seconds"], stats["iterations"], stats["nodes"])
         self.save_final_strategy(target_i)
+        if self.telemetry is not None:
+            self.telemetry.flush()
+
+# runs traversals in worker processes on a SharedNodeTable. Iterations are handed out
+# by a shared counter in rounds of checkpoint_interval; the workers exit at the end of
+# each round so the checkpoint sees every update of exactly that many iterations.
+# dcfr discounts are applied once per round, compounded over its iterations
+class ParallelMCCFRTrainer(MCCFRTrainer):
+    def __init__(self, checkpoint_dir="mccfr_checkpoints", workers=None, **options):
+        super().__init__(checkpoint_dir=checkpoint_dir, **options)
+        self.workers = workers or os.cpu_count() or 1
+        self.context = multiprocessing.get_context()
+
+    def train(self, target_i, checkpoint_interval=1000, log_interval=10, capacity=1 << 16, full_checkpoint_every=1, eval_deals=0):
+        start_time = time.time()
+        if self.start_iteration >= target_i:
+            return
+        counter = self.context.Value('q', self.start_iteration)
+        round_end = self.start_iteration
+        while round_end < target_i:
+            round_end = min((round_end // checkpoint_interval + 1) * checkpoint_interval, target_i)
+            round_start_time, round_start = time.time(), counter.value
+            # workers also stop early when the table gets 3/4 full, it is then grown and the round resumed
+            while counter.value < round_end:
+                self.ensure_capacity(capacity)
+                processes = [self.context.Process(target=_train_worker, args=(self, counter, round_end))
+                             for _ in range(self.workers)]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+                if any(process.exitcode != 0 for process in processes):
+                    raise RuntimeError(f"MCCFR worker failed in the round ending at iteration {round_end}")
+            self.end_iterations(round_start + 1, round_end)
+            rate = (round_end - round_start) / (time.time() - round_start_time)
+            # node counts stay in the workers, so there is no nodes/s here
+            self.record_telemetry("progress", round_end, iterations_per_second=rate)
+            if round_end % checkpoint_interval == 0:
+                self.checkpoint(round_end, delta=self.is_delta_checkpoint(round_end, checkpoint_interval, full_checkpoint_every),
+                                eval_deals=eval_deals)
+            print(f"Iteration {round_end}/{target_i} | Nodes: {len(self.node_table)} | "
+                  f"Workers: {self.workers} | It/s: {rate:.1f} | Time: {time.time() - start_time}")
+        self.save_final_strategy(target_i)
+        if self.telemetry is not None:
+            self.telemetry.flush()
+
+    # the shared table can not grow while workers run, so it is rebuilt between rounds
+    # whenever it is more than half full
+    def ensure_capacity(self, capacity):
+        table = self.node_table
+        if isinstance(table, SharedNodeTable) and len(table) * 2 <= table.capacity:
+            return
+        capacity = max(capacity, len(table) * 4)
+        if isinstance(table, SharedNodeTable):
+            table = table.to_table()
+        self.node_table = SharedNodeTable.from_table(table, capacity, context=self.context)
+
+def _train_worker(trainer, counter, round_end):
+    random.seed()
+    table = trainer.node_table
+    while True:
+        with counter.get_lock():
+            if counter.value >= round_end or len(table) * 4 > table.capacity * 3:
+                return
+            counter.value += 1
+            iteration = counter.value
+        trainer.begin_iteration(iteration)
+        for p_id in range(PLAYER_COUNT):
+            trainer.traverse(GameState(trainer.abstraction), p_id)
+
+# ------ comparing update rules -------
+def play_head_to_head(strategy_a, strategy_b, hands, seed=0, abstraction="buckets"):
+    """Chips per hand won by strategy_a against strategy_b.
+
+    Strategies are callables from an infoset key to probabilities over INTERNAL_ACTIONS
+    (e.g. MCCFRTrainer.get_average_strategy). Every deal is played twice with the
+    seats swapped and the same random stream, which cancels most of the card luck.
+    """
+    random_state = random.getstate()
+    total = 0.0
+    for deal in range(max(hands // 2, 1)):
+        for seat_a in range(PLAYER_COUNT):
+            random.seed(seed * 1000003 + deal)
+            game_state = GameState(abstraction)
+            while not game_state.is_terminal():
+                if game_state.is_chance_node():
+                    game_state.advance_street()
+                    continue
+                player = game_state.get_current_player()
+                strategy = strategy_a if player == seat_a else strategy_b
+                valid_actions = game_state.get_valid_actions()
+                probs = strategy(game_state.get_infoset_key_for_player(player))
+                weights = [probs[action] for action in valid_actions]
+                if sum(weights) <= 0:
+                    weights = [1.0] * len(valid_actions)
+                game_state.apply_action(random.choices(valid_actions, weights=weights, k=1)[0])
+            total += game_state.get_utility(seat_a)
+    random.setstate(random_state)
+    return total / (max(hands // 2, 1) * PLAYER_COUNT)
+
+def compare_update_rules(rules=UPDATE_RULES, seconds=60, eval_hands=2000, baseline="vanilla", seed=0, br_deals=2000):
+    """Train a fresh table per rule for the same wall time, play each against the baseline rule
+    and measure its sampled best response exploitability (skipped if br_deals is 0)."""
+    trained = {}
+    for rule in list(rules) + ([baseline] if baseline not in rules else []):
+        checkpoint_dir = tempfile.mkdtemp(prefix="mccfr_compare_")
+        try:
+            trainer = MCCFRTrainer(checkpoint_dir=checkpoint_dir, update_rule=rule)
+        finally:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        random.seed(seed)
+        start_time, iteration = time.time(), 0
+        while time.time() - start_time < seconds:
+            iteration += 1
+            trainer.run_iteration(iteration)
+        trained[rule] = (trainer, iteration, time.time() - start_time)
+    baseline_strategy = trained[baseline][0].get_average_strategy
+    tree = PublicTree() if br_deals else None
+    results = []
+    for rule in rules:
+        trainer, iterations, elapsed = trained[rule]
+        value = play_head_to_head(trainer.get_average_strategy, baseline_strategy, eval_hands, seed)
+        exploit = exploitability(trainer.node_table, br_deals, br_deals, seed, tree)["exploitability"] if br_deals else float("nan")
+        results.append({"rule": rule, "iterations": iterations, "seconds": elapsed,
+                        "nodes": len(trainer.node_table), "value_vs_baseline": value, "exploitability": exploit})
+    print(f"{'rule':<8} {'iters':>8} {'it/s':>8} {'nodes':>8} {'chips/hand vs ' + baseline:>24} {'mbb/hand':>10}")
+    for result in results:
+        print(f"{result['rule']:<8} {result['iterations']:>8} {result['iterations'] / result['seconds']:>8.1f} "
+              f"{result['nodes']:>8} {result['value_vs_baseline']:>24.3f} {result['exploitability']:>10.1f}")
+    return results
 
 if __name__ == "__main__":
-    checkpoint_directory = "mccfr_checkpoints_10k"
-    trainer = MCCFRTrainer(checkpoint_dir=checkpoint_directory)
-    trainer.train(target_i=10000, checkpoint_interval=1000)
+    parser = argparse.ArgumentParser(description="Train the MCCFR strategy, or compare update rules")
+    parser.add_argument("--update-rule", choices=UPDATE_RULES, default="vanilla")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--checkpoint-dir", default="mccfr_checkpoints_10k")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sampling", choices=SAMPLING_SCHEMES, default="external")
+    parser.add_argument("--prune-threshold", type=float, default=None, help="enable regret-based pruning below this regret")
+    parser.add_argument("--compare", action="store_true", help="train every update rule for --seconds and play them against vanilla")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--eval-hands", type=int, default=2000)
+    parser.add_argument("--br-deals", type=int, default=2000, help="deals per best response fit and evaluation, 0 to skip")
+    parser.add_argument("--abstraction", choices=CARD_ABSTRACTIONS, default="buckets",
+                        help="card abstraction, equity needs the tables of python -m sub.mccfr.equity_abstraction")
+    parser.add_argument("--telemetry", default=None, help="append training telemetry to this .jsonl or .csv file")
+    parser.add_argument("--eval-deals", type=int, default=0, help="exploitability deals at every checkpoint, 0 to skip")
+    args = parser.parse_args()
+    if args.compare:
+        compare_update_rules(seconds=args.seconds, eval_hands=args.eval_hands, br_deals=args.br_deals)
+    else:
+        telemetry = TelemetrySink(args.telemetry, fields=TELEMETRY_FIELDS) if args.telemetry else None
+        trainer = ParallelMCCFRTrainer(checkpoint_dir=args.checkpoint_dir, workers=args.workers, update_rule=args.update_rule,
+                                       sampling=args.sampling, prune_threshold=args.prune_threshold, telemetry=telemetry,
+                                       abstraction=args.abstraction)
+        trainer.train(target_i=args.iterations, checkpoint_interval=1000, eval_deals=args.eval_deals)
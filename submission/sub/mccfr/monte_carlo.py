@@ -1,8 +1,6 @@
 import random
-# basic library to see who wins a poker hand
-from pokereval.card import Card
-from pokereval.hand_evaluator import HandEvaluator
-from sub.mccfr.mccfr_abstraction import get_infoset_key
+from pypokerengine.engine.hand_evaluator import HandEvaluator
+from sub.mccfr.mccfr_abstraction import get_card_key, get_betting_key
 
 SMALL_BLIND = 5
 BIG_BLIND = 10
@@ -16,10 +14,15 @@ FULL_DECK_INTS = list(range(52))
 RANKS_STR = "23456789TJQKA"
 SUITS_STR = "shdc"
 STREETS = ["preflop", "flop", "turn", "river"]
+# card int -> Card.to_id() of the engine (suits s, h, d, c are engine suits 3, 2, 1, 0, ace is rank 1)
+ENGINE_CARD_IDS = [(1 if c // 4 == 12 else c // 4 + 2) + 13 * (3 - c % 4) for c in FULL_DECK_INTS]
+BOARD_SIZES = [0, 3, 4, 5] # community cards per street
 
 # modified and simplified poker engine to allow for mccfr, track histories
 class GameState:
-    def __init__(self):
+    # abstraction: card abstraction of the infoset keys (mccfr_abstraction.CARD_ABSTRACTIONS)
+    def __init__(self, abstraction="buckets"):
+        self.abstraction = abstraction
         self.stacks = [INITIAL_STACK] * PLAYER_COUNT
         self.hole_cards = [[] for _ in range(PLAYER_COUNT)]
         self.hole_cards_str = [[] for _ in range(PLAYER_COUNT)]
@@ -37,6 +40,7 @@ class GameState:
         self.is_terminal_state = False
         self.winner = -1
         self.street_ended = False
+        self.undo_log = []
         self.new_hand()
 
     def card_int_to_str(self, card_int):
@@ -44,17 +48,6 @@ class GameState:
         suit_index = card_int % 4
         return f"{RANKS_STR[rank_index]}{SUITS_STR[suit_index]}"
 
-    # pokereval specific thing
-    def ints_to_cards(self, card_int_list):
-        card_objects = []
-        for card_int in card_int_list:
-            rank_index_0_12 = card_int // 4
-            suit_index_0_3 = card_int % 4
-            pokereval_rank = rank_index_0_12 + 2
-            pokereval_suit = suit_index_0_3 + 1
-            card_objects.append(Card(pokereval_rank, pokereval_suit))
-        return card_objects
-
     def deal(self, num_cards):
         return [self.current_deck.pop() for _ in range(num_cards)]
 
@@ -77,13 +70,15 @@ class GameState:
         self.is_terminal_state = False
         self.winner = -1
         self.street_ended = False
+        self.undo_log = []
 
 
         for i in range(PLAYER_COUNT):
             dealt_ints = self.deal(2)
             self.hole_cards[i] = dealt_ints
             self.hole_cards_str[i] = [self.card_int_to_str(c) for c in dealt_ints]
-       
+        self.compute_card_keys()
+
         # post blinds (in this case player0 is always small blind, so slightly innacurate)
         sb_player, bb_player = 0, 1
         sb_amount = min(SMALL_BLIND, self.stacks[sb_player])
@@ -101,6 +96,34 @@ class GameState:
          self.pot += amount
          return amount
 
+    # undo log, so a traversal can run on a single state instead of deep copies:
+    # apply_action / advance_street push a snapshot of everything they change and
+    # undo(token) rolls back to the state the token was taken at
+    def mark(self):
+        self.undo_log.append((
+            tuple(self.stacks), tuple(self.street_bets), tuple(self.round_bets), self.pot,
+            self.street, len(self.history[self.street]), self.num_street_raises,
+            self.last_raiser, self.player_to_act, self.is_terminal_state, self.winner,
+            self.street_ended, len(self.community_cards), self.community_cards_str))
+        return len(self.undo_log) - 1
+
+    def undo(self, token=None):
+        if token is None:
+            token = len(self.undo_log) - 1
+        while len(self.undo_log) > token:
+            (stacks, street_bets, round_bets, self.pot, self.street, history_len,
+             self.num_street_raises, self.last_raiser, self.player_to_act,
+             self.is_terminal_state, self.winner, self.street_ended, community_len,
+             self.community_cards_str) = self.undo_log.pop()
+            self.stacks = list(stacks)
+            self.street_bets = list(street_bets)
+            self.round_bets = list(round_bets)
+            del self.history[self.street][history_len:]
+            # dealt cards go back on top of the deck in reverse order
+            while len(self.community_cards) > community_len:
+                self.current_deck.append(self.community_cards.pop())
+        return self
+
     def get_current_player(self): return self.player_to_act
     def is_terminal(self): return self.is_terminal_state
     def is_chance_node(self): return self.street_ended and not self.is_terminal_state
@@ -111,7 +134,7 @@ class GameState:
             if len(active_players_with_bets) == 1: # folded out
                 self.winner = active_players_with_bets[0]
             else: # showdown
-                self.winner = self.eval_win()
+                self.winner = self.get_showdown_winner()
 
         # Calculate utility
         if self.winner == -2: # Split pot
@@ -121,15 +144,20 @@ class GameState:
         else: # Player lost
             return -self.round_bets[player_id]
 
+    # every showdown of a deal has the same hole cards and board, so the winner is
+    # evaluated once per deal (reset by new_hand / compute_card_keys)
+    def get_showdown_winner(self):
+        if self.showdown_winner is None:
+            self.showdown_winner = self.eval_win()
+        return self.showdown_winner
+
+    # showdown by the engine's evaluator, so the trainer plays the same showdown rules as the games
     def eval_win(self):
         p0, p1 = 0, 1
 
-        p0_cards = self.ints_to_cards(self.hole_cards[p0])
-        p1_cards = self.ints_to_cards(self.hole_cards[p1])
-        board_cards = self.ints_to_cards(self.community_cards)
-
-        p0_score = HandEvaluator.evaluate_hand(p0_cards, board_cards)
-        p1_score = HandEvaluator.evaluate_hand(p1_cards, board_cards)
+        board_ids = [ENGINE_CARD_IDS[c] for c in self.community_cards]
+        p0_score = HandEvaluator.eval_hand_from_ids([ENGINE_CARD_IDS[c] for c in self.hole_cards[p0]], board_ids)
+        p1_score = HandEvaluator.eval_hand_from_ids([ENGINE_CARD_IDS[c] for c in self.hole_cards[p1]], board_ids)
 
         if p0_score > p1_score:
             return p0
@@ -139,6 +167,7 @@ class GameState:
             return -2
 
     def advance_street(self):
+        self.mark()
         num_cards = 0
         next_street = None
         if self.street == "preflop":
@@ -198,7 +227,9 @@ class GameState:
 
             return sorted(list(set(valid)))
 
+    # returns the undo token of the action
     def apply_action(self, internal_action):
+        token = self.mark()
         player = self.player_to_act
         opponent = 1 - player
         player_bet_this_street = self.street_bets[player]
@@ -212,7 +243,7 @@ class GameState:
              if not self.street_ended:
                   if not (self.stacks[opponent] <= 0 and self.street_bets[opponent] >= max(self.street_bets)):
                        self.player_to_act = opponent
-             return self
+             return token
 
         if internal_action == 0: # Fold
             action_char = 'f'
@@ -249,7 +280,7 @@ class GameState:
         if self.is_terminal_state:
              self.player_to_act = -1
 
-        return self
+        return token
 
     def check_street_end(self):
          if self.is_terminal_state:
@@ -290,15 +321,17 @@ class GameState:
 
          self.street_ended = is_closed
 
+    # the buckets of a deal do not change during a traversal, so the card part of every key
+    # (card_keys[player][street]) is computed once per deal. The board is the top of the
+    # deck in the order deal() pops it; call again after changing hole cards or the deck
+    def compute_card_keys(self):
+        self.showdown_winner = None
+        board = [self.card_int_to_str(c) for c in self.current_deck[:-6:-1]]
+        self.card_keys = [[get_card_key(street, self.hole_cards_str[p], board[:BOARD_SIZES[i]], self.abstraction)
+                           for i, street in enumerate(STREETS)] for p in range(PLAYER_COUNT)]
+
     # for our infosets, we only use the street, our hole cards, community cards, the number of bets, and number of raises previously
     def get_infoset_key_for_player(self, player_id):
-        hole_cards_for_key = self.hole_cards_str[player_id] 
-        current_street_history = self.history[self.street]
-        return get_infoset_key(
-            street=self.street,
-            hole_card_str_list=hole_cards_for_key,
-            community_card_str_list=self.community_cards_str,
-            betting_history=current_street_history,
-            num_raises_street=self.num_street_raises
-        )
+        return (self.card_keys[player_id][STREETS.index(self.street)]
+                | get_betting_key(self.history[self.street], self.num_street_raises))
 
@@ -0,0 +1,348 @@
+import os
+import json
+import shutil
+import multiprocessing
+import numpy as np
+
+CHUNK_ROWS = 4096
+COLUMNS_FORMAT = 1
+
+class NodeTable:
+    """Regret and strategy sums of every infoset, one row per infoset.
+
+    regret_sum and strategy_sum are (capacity x num_actions) float arrays that grow
+    by CHUNK_ROWS rows when full; index maps an infoset key to its row and keys
+    lists the keys in row order, so only the first len(self) rows are in use.
+    touched flags the rows looked up since the last save_columns, for delta checkpoints.
+    """
+    def __init__(self, num_actions=3, capacity=CHUNK_ROWS):
+        self.num_actions = num_actions
+        self.index = {}
+        self.keys = []
+        self.regret_sum = np.zeros((capacity, num_actions))
+        self.strategy_sum = np.zeros((capacity, num_actions))
+        self.touched = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def row(self, key):
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.regret_sum):
+                self.grow(row + CHUNK_ROWS)
+            self.index[key] = row
+            self.keys.append(key)
+        self.touched[row] = True
+        return row
+
+    # rows of a batch of keys (vector_cfr), missing keys are added in order
+    def rows(self, keys):
+        index = self.index
+        rows = [index.get(key) for key in keys]
+        if None in rows:
+            rows = [self.row(key) if row is None else row for key, row in zip(keys, rows)]
+        rows = np.array(rows, dtype=np.int64)
+        self.touched[rows] = True
+        return rows
+
+    def grow(self, capacity):
+        for name in ("regret_sum", "strategy_sum", "touched"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def rekey(self, convert):
+        self.keys = [convert(key) for key in self.keys]
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        if len(self.index) != len(self.keys):
+            raise ValueError("Key conversion maps several infosets to the same key")
+
+    # regret matching over the valid actions of one row, aligned with valid_actions
+    def strategy(self, row, valid_actions):
+        positive = np.maximum(self.regret_sum[row, valid_actions], 0.0)
+        norm_sum = positive.sum()
+        if norm_sum > 0:
+            return positive / norm_sum
+        return np.full(len(valid_actions), 1.0 / len(valid_actions))
+
+    # scales positive and negative regrets and the strategy sums of every row (discounted CFR);
+    # every row changes, so the next delta checkpoint writes them all
+    def discount(self, positive_factor, negative_factor, strategy_factor):
+        regrets = self.regret_sum[:len(self)]
+        regrets *= np.where(regrets > 0, positive_factor, negative_factor)
+        self.strategy_sum[:len(self)] *= strategy_factor
+        self.touched[:len(self)] = True
+
+    # regret matching of every row at once, all actions valid
+    def current_strategies(self):
+        positive = np.maximum(self.regret_sum[:len(self)], 0.0)
+        return self.__normalize(positive)
+
+    def average_strategies(self):
+        return self.__normalize(self.strategy_sum[:len(self)])
+
+    def average_strategy(self, key):
+        if key not in self:
+            return [1.0 / self.num_actions] * self.num_actions
+        return self.__normalize(self.strategy_sum[self.row(key)][None, :])[0].tolist()
+
+    def __normalize(self, sums):
+        norm_sum = sums.sum(axis=1, keepdims=True)
+        uniform = np.full_like(sums, 1.0 / self.num_actions)
+        return np.divide(sums, norm_sum, out=uniform, where=norm_sum > 0)
+
+    # single .npz checkpoints of the earlier format, extra values (e.g. iteration) are returned alongside
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            regret_sum, strategy_sum = data['regret_sum'], data['strategy_sum']
+            table = cls(num_actions=regret_sum.shape[1], capacity=len(regret_sum) + CHUNK_ROWS)
+            table.keys = _load_keys(data['keys'])
+            table.index = {key: row for row, key in enumerate(table.keys)}
+            table.regret_sum[:len(regret_sum)] = regret_sum
+            table.strategy_sum[:len(strategy_sum)] = strategy_sum
+            extra = {name: data[name] for name in data.files
+                     if name not in ('keys', 'regret_sum', 'strategy_sum')}
+        return table, extra
+
+    # columnar checkpoint: a directory of .npy arrays plus manifest.json, written to
+    # path + ".tmp" and renamed into place. With base (the name of an earlier checkpoint
+    # in the same directory) only the rows touched since the last save are written.
+    def save_columns(self, path, iteration, base=None, **extra):
+        size = len(self)
+        manifest = dict(extra, format=COLUMNS_FORMAT, iteration=int(iteration), rows=size,
+                        num_actions=self.num_actions, base=base)
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        keys = self.__key_array()
+        if base is None:
+            _save_array(tmp_path, "keys", keys)
+            _save_array(tmp_path, "regret_sum", self.regret_sum[:size])
+            _save_array(tmp_path, "strategy_sum", self.strategy_sum[:size])
+        else:
+            rows = np.nonzero(self.touched[:size])[0]
+            _save_array(tmp_path, "rows", rows)
+            _save_array(tmp_path, "keys", keys[rows])
+            _save_array(tmp_path, "regret_sum", self.regret_sum[rows])
+            _save_array(tmp_path, "strategy_sum", self.strategy_sum[rows])
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace_dir(tmp_path, path)
+        self.touched[:] = False
+        return manifest
+
+    # the arrays of a full checkpoint are memory-mapped (copy-on-write by default), so
+    # loading costs the key index only; deltas are applied on top of their base
+    @classmethod
+    def load_columns(cls, path, mmap_mode='c'):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["format"] != COLUMNS_FORMAT:
+            raise ValueError("Unknown checkpoint format %s in %s" % (manifest["format"], path))
+        keys = _load_keys(np.load(os.path.join(path, "keys.npy")))
+        regret_sum = np.load(os.path.join(path, "regret_sum.npy"), mmap_mode=mmap_mode)
+        strategy_sum = np.load(os.path.join(path, "strategy_sum.npy"), mmap_mode=mmap_mode)
+        if manifest["base"] is None:
+            table = cls(num_actions=manifest["num_actions"], capacity=0)
+            table.keys = keys
+            table.regret_sum = regret_sum.view(np.ndarray)
+            table.strategy_sum = strategy_sum.view(np.ndarray)
+            table.touched = np.zeros(len(keys), dtype=bool)
+        else:
+            table, _ = cls.load_columns(os.path.join(os.path.dirname(path), manifest["base"]), mmap_mode)
+            rows = np.load(os.path.join(path, "rows.npy"))
+            if manifest["rows"] > len(table.regret_sum):
+                table.grow(manifest["rows"] + CHUNK_ROWS)
+            # rows added since the base were all touched, in row order
+            new_from = int(np.searchsorted(rows, len(table.keys)))
+            table.keys = table.keys + keys[new_from:]
+            table.regret_sum[rows] = regret_sum
+            table.strategy_sum[rows] = strategy_sum
+            table.touched[:] = False
+        table.index = dict(zip(table.keys, range(len(table.keys))))
+        return table, manifest
+
+    # string keys are ascii, bytes take a quarter of the space of a unicode array
+    def __key_array(self):
+        if self.keys and isinstance(self.keys[0], str):
+            return np.array([key.encode() for key in self.keys])
+        return np.array(self.keys)
+
+    # node_map of the pickle checkpoints: key -> {'regret_sum': [...], 'strategy_sum': [...]}
+    @classmethod
+    def from_node_map(cls, node_map, num_actions=3):
+        table = cls(num_actions=num_actions, capacity=len(node_map) + CHUNK_ROWS)
+        for key, node in node_map.items():
+            row = table.row(key)
+            table.regret_sum[row] = node['regret_sum'][:num_actions]
+            table.strategy_sum[row] = node['strategy_sum'][:num_actions]
+        return table
+
+
+EMPTY_SLOT = -1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+def _save_array(directory, name, array):
+    with open(os.path.join(directory, name + ".npy"), "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _load_keys(keys):
+    if keys.dtype.kind == 'S':
+        return [key.decode() for key in keys.tolist()]
+    return keys.tolist()
+
+# a directory can not be renamed over a non-empty one, the old one is moved aside first
+def _replace_dir(src, dst):
+    old = None
+    if os.path.exists(dst):
+        old = dst + ".old"
+        if os.path.exists(old):
+            shutil.rmtree(old)
+        os.replace(dst, old)
+    os.replace(src, dst)
+    if old is not None:
+        shutil.rmtree(old)
+
+
+class SharedNodeTable(NodeTable):
+    """NodeTable in shared memory, for worker processes training concurrently.
+
+    Keys must be non-negative ints (packed infoset keys). The index is an open
+    addressing hash table (Fibonacci hashing, linear probing) of int64 slot keys
+    and rows, sized for a fixed capacity chosen up front. Lookups read it
+    without locking; inserts take the lock, re-probe and publish the slot key
+    last so a reader never sees a key without its row. Regret and strategy
+    updates are Hogwild: workers add to the shared rows without any lock and
+    an occasional lost update is tolerated. Each process keeps a private
+    key -> row cache since rows never move.
+    """
+    def __init__(self, num_actions=3, capacity=1 << 16, context=multiprocessing):
+        self.num_actions = num_actions
+        self.capacity = capacity
+        slot_bits = max(capacity * 2 - 1, 1).bit_length()
+        self.__buffers = {
+            "slot_keys": context.RawArray('q', 1 << slot_bits),
+            "slot_rows": context.RawArray('q', 1 << slot_bits),
+            "row_keys": context.RawArray('q', capacity),
+            "regret_sum": context.RawArray('d', capacity * num_actions),
+            "strategy_sum": context.RawArray('d', capacity * num_actions),
+            "touched": context.RawArray('b', capacity),
+            "size": context.RawValue('q', 0)
+        }
+        self.__lock = context.Lock()
+        self.__attach()
+        self.slot_keys[:] = EMPTY_SLOT
+
+    def __attach(self):
+        buffers = self.__buffers
+        self.slot_keys = np.frombuffer(buffers["slot_keys"], dtype=np.int64)
+        self.slot_rows = np.frombuffer(buffers["slot_rows"], dtype=np.int64)
+        self.row_keys = np.frombuffer(buffers["row_keys"], dtype=np.int64)
+        self.regret_sum = np.frombuffer(buffers["regret_sum"]).reshape(self.capacity, self.num_actions)
+        self.strategy_sum = np.frombuffer(buffers["strategy_sum"]).reshape(self.capacity, self.num_actions)
+        self.touched = np.frombuffer(buffers["touched"], dtype=np.bool_)
+        self.__size = buffers["size"]
+        self.__slot_shift = 64 - (len(self.slot_keys) - 1).bit_length()
+        self.__slot_mask = len(self.slot_keys) - 1
+        self.index = {}
+
+    # the numpy views are rebuilt on the shared buffers in the receiving process
+    def __getstate__(self):
+        return {"num_actions": self.num_actions, "capacity": self.capacity,
+                "buffers": self.__buffers, "lock": self.__lock}
+
+    def __setstate__(self, state):
+        self.num_actions = state["num_actions"]
+        self.capacity = state["capacity"]
+        self.__buffers = state["buffers"]
+        self.__lock = state["lock"]
+        self.__attach()
+
+    @classmethod
+    def from_table(cls, table, capacity, context=multiprocessing):
+        if capacity < len(table):
+            raise ValueError("Capacity %d is below the %d rows of the table" % (capacity, len(table)))
+        shared = cls(num_actions=table.num_actions, capacity=capacity, context=context)
+        for key in table.keys:
+            shared.row(key)
+        shared.regret_sum[:len(table)] = table.regret_sum[:len(table)]
+        shared.strategy_sum[:len(table)] = table.strategy_sum[:len(table)]
+        shared.touched[:len(table)] = table.touched[:len(table)]
+        return shared
+
+    def to_table(self):
+        size = len(self)
+        table = NodeTable(num_actions=self.num_actions, capacity=size + CHUNK_ROWS)
+        table.keys = self.keys
+        table.index = {key: row for row, key in enumerate(table.keys)}
+        table.regret_sum[:size] = self.regret_sum[:size]
+        table.strategy_sum[:size] = self.strategy_sum[:size]
+        table.touched[:size] = self.touched[:size]
+        return table
+
+    def __len__(self):
+        return self.__size.value
+
+    def __contains__(self, key):
+        return self.__probe(key)[1] != EMPTY_SLOT
+
+    @property
+    def keys(self):
+        return self.row_keys[:len(self)].tolist()
+
+    def row(self, key):
+        row = self.index.get(key)
+        if row is None:
+            slot, row = self.__probe(key)
+            if row == EMPTY_SLOT:
+                with self.__lock:
+                    slot, row = self.__probe(key, slot)
+                    if row == EMPTY_SLOT:
+                        row = self.__insert(key, slot)
+            self.index[key] = row
+        self.touched[row] = True
+        return row
+
+    def rows(self, keys):
+        return np.array([self.row(key) for key in keys], dtype=np.int64)
+
+    def grow(self, capacity):
+        raise ValueError("SharedNodeTable is full (capacity %d rows)" % self.capacity)
+
+    def rekey(self, convert):
+        raise ValueError("SharedNodeTable keys can not be converted")
+
+    # slot of key (or of the empty slot ending its probe sequence) and its row
+    def __probe(self, key, slot=None):
+        slot_keys, mask = self.slot_keys, self.__slot_mask
+        if slot is None:
+            slot = ((key * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.__slot_shift
+        while True:
+            slot_key = slot_keys[slot]
+            if slot_key == key:
+                return slot, int(self.slot_rows[slot])
+            if slot_key == EMPTY_SLOT:
+                return slot, EMPTY_SLOT
+            slot = (slot + 1) & mask
+
+    def __insert(self, key, slot):
+        row = self.__size.value
+        if row == self.capacity:
+            self.grow(row + 1)
+        self.row_keys[row] = key
+        self.slot_rows[slot] = row
+        self.slot_keys[slot] = key
+        self.__size.value = row + 1
+        return row
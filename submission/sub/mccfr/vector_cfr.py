@@ -0,0 +1,207 @@
+import time
+import argparse
+import itertools
+import numpy as np
+from pypokerengine.engine.hand_evaluator import HandEvaluator
+from monte_carlo import PLAYER_COUNT, STREETS, ENGINE_CARD_IDS
+from mccfr_trainer import MCCFRTrainer, UPDATE_RULES, TELEMETRY_FIELDS
+from best_response import PublicTree, NOT_TERMINAL, FOLD
+from sub.mccfr.mccfr_abstraction import get_betting_key, CARD_ABSTRACTIONS
+from sub.mccfr.equity_abstraction import get_card_keys
+from sub.telemetry import TelemetrySink
+
+# the 1326 two card combos of monte_carlo card ints
+COMBOS = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+
+class VectorCFRTrainer(MCCFRTrainer):
+    """Public chance sampling CFR: an iteration samples the board only and walks the public
+    betting tree once, carrying the reach of every private hand of both players as vectors.
+
+    Infoset keys only hold the betting of the current street, so the decision nodes sharing
+    street and street history (the 35 PublicTree.groups of its 4555 decision nodes) share
+    their keys and strategy. The walk is done per group: the reach of all its nodes is one
+    (nodes x players x hands) array pushed top down, the counterfactual values come back
+    bottom up, and the rows of a group are looked up and updated once per iteration.
+
+    Both players are updated at every decision node. Regrets of the hands sharing an infoset
+    key are summed into its NodeTable row, so checkpoints, update rules, telemetry and the
+    strategy files are those of MCCFRTrainer (sampling is reported as "vector").
+    Counterfactual values are summed over the opponent hands that do not share a card:
+    folds by inclusion-exclusion over the cards, showdowns by a product with the board's
+    (hands x hands) win/loss matrix (the engine evaluator, as GameState.eval_win). Chance weights
+    each hand 1 / (number of hands), which keeps regrets on the scale of the sampled trainer.
+    """
+    def __init__(self, checkpoint_dir="mccfr_checkpoints", **options):
+        super().__init__(checkpoint_dir=checkpoint_dir, **options)
+        self.sampling = "vector"
+        self.counters["vector"] = {"iterations": 0, "nodes": 0, "pruned": 0, "seconds": 0.0}
+        self.tree = PublicTree()
+        self.groups = self.tree.groups[::-1] # top down, the root first
+        self.build_groups()
+        self.rng = np.random.default_rng()
+
+    # per group: street, acting player, betting key, valid actions and per valid action
+    # (action, child group or -1, positions of the children in the child group (a slice when
+    # they are all of it, in order), terminal, payoff per node and player: chips won or lost
+    # on a fold, chips at stake at a showdown)
+    def build_groups(self):
+        tree = self.tree
+        location = {node: (group, position) for group, nodes in enumerate(self.groups) for position, node in enumerate(nodes)}
+        self.group_info = []
+        self.parent_num = [0] * len(self.groups) # groups with children in each group
+        for nodes in self.groups:
+            node = nodes[0]
+            actions = []
+            for action in tree.valid_actions[node]:
+                children = [tree.children[parent][action] for parent in nodes]
+                terminal = tree.terminal[children[0]]
+                if terminal == NOT_TERMINAL:
+                    child_group = location[children[0]][0]
+                    self.parent_num[child_group] += 1
+                    positions = np.array([location[child][1] for child in children])
+                    if np.array_equal(positions, np.arange(len(self.groups[child_group]))):
+                        positions = slice(None)
+                    actions.append((action, child_group, positions, terminal, None))
+                    continue
+                bets = np.array([tree.bets[child] for child in children], dtype=float)
+                if terminal == FOLD:
+                    winner = tree.winner[children[0]]
+                    payoff = np.stack([bets[:, 1 - p] if winner == p else -bets[:, p] for p in range(PLAYER_COUNT)], axis=1)
+                else:
+                    payoff = bets # bets are equal at showdown
+                actions.append((action, -1, None, terminal, payoff))
+            self.group_info.append((tree.street[node], tree.player[node], get_betting_key(tree.history[node], tree.raises[node]),
+                                    tree.valid_actions[node], actions))
+
+    def run_iteration(self, t):
+        start_time = time.time()
+        self.begin_iteration(t)
+        self.deal(self.rng.choice(52, 5, replace=False))
+        strategies = self.current_strategies()
+        self.update_groups(strategies, self.propagate_reach(strategies))
+        self.end_iterations(t, t)
+        self.counter["iterations"] += 1
+        self.counter["seconds"] += time.time() - start_time
+
+    # per board: the hands left, their card keys per street and the showdown matrix
+    def deal(self, board):
+        self.hands = COMBOS[~np.isin(COMBOS, board).any(axis=1)]
+        self.street_keys = [np.unique(get_card_keys(street, self.hands, board, self.abstraction), return_inverse=True)
+                            for street in STREETS] # (unique card keys, index of each hand's key)
+        cards = np.setdiff1d(np.arange(52), board)
+        card_index = np.zeros(52, dtype=np.int64)
+        card_index[cards] = np.arange(len(cards))
+        self.card_matrix = np.zeros((len(self.hands), len(cards))) # hands x cards off the board
+        self.card_matrix[np.arange(len(self.hands))[:, None], card_index[self.hands]] = 1.0
+        board_ids = [ENGINE_CARD_IDS[c] for c in board]
+        values = np.array([HandEvaluator.eval_hand_from_ids([ENGINE_CARD_IDS[c] for c in hand], board_ids)
+                           for hand in self.hands.tolist()])
+        # opponent hand (row) against hand (column): 1 if weaker, -1 if stronger, 0 on a tie or a shared card
+        compatible = self.card_matrix @ self.card_matrix.T == 0
+        self.showdown_matrix = np.sign(values[None, :] - values[:, None]) * compatible.astype(float)
+
+    # reach of the opponent hands that share no card with each hand, per row of reach
+    def compatible_reach(self, reach):
+        card_sums = reach @ self.card_matrix
+        return reach.sum(axis=1, keepdims=True) - card_sums @ self.card_matrix.T + reach
+
+    # reach of the compatible opponent hands weaker than each hand minus the stronger ones
+    def showdown_reach(self, reach):
+        return reach @ self.showdown_matrix
+
+    # regret matching at the start of the iteration: per group its rows and (hands x valid actions)
+    def current_strategies(self):
+        table = self.node_table
+        strategies = []
+        for nodes, (street, player, betting_key, valid, actions) in zip(self.groups, self.group_info):
+            unique_keys, inverse = self.street_keys[street]
+            rows = table.rows((unique_keys | betting_key).tolist())
+            self.counter["nodes"] += len(rows) * len(nodes)
+            positive = np.maximum(table.regret_sum[np.ix_(rows, valid)], 0.0)
+            norm = positive.sum(axis=1, keepdims=True)
+            key_strategy = np.divide(positive, norm, out=np.full(positive.shape, 1.0 / len(valid)), where=norm > 0)
+            strategies.append((rows, key_strategy[inverse]))
+        return strategies
+
+    # reach of both players at every node, top down, one (nodes x players x hands) array per group
+    def propagate_reach(self, strategies):
+        hand_num = len(self.hands)
+        reach = [None] * len(self.groups)
+        reach[0] = np.full((1, PLAYER_COUNT, hand_num), 1.0 / hand_num)
+        for group, (street, player, betting_key, valid, actions) in enumerate(self.group_info):
+            strategy = strategies[group][1]
+            for i, (action, child, positions, terminal, payoff) in enumerate(actions):
+                if child < 0:
+                    continue
+                if reach[child] is None:
+                    reach[child] = np.empty((len(self.groups[child]), PLAYER_COUNT, hand_num))
+                reach[child][positions, 1 - player] = reach[group][:, 1 - player]
+                reach[child][positions, player] = reach[group][:, player] * strategy[:, i]
+        return reach
+
+    def update_groups(self, strategies, reach):
+        """Counterfactual values of every group bottom up, one (nodes x hands) array per player,
+        updating the regrets and strategy sums of its rows. Returns both players' values at the root."""
+        hand_num = len(self.hands)
+        values = [None] * len(self.groups)
+        parents_left = list(self.parent_num)
+        for group in reversed(range(len(self.groups))):
+            street, player, betting_key, valid, actions = self.group_info[group]
+            rows, strategy = strategies[group]
+            group_reach, reach[group] = reach[group], None
+            node_num = len(group_reach)
+            own = np.empty((len(actions), node_num, hand_num))
+            other = np.zeros((node_num, hand_num))
+            for i, (action, child, positions, terminal, payoff) in enumerate(actions):
+                if child >= 0:
+                    own[i] = values[child][player][positions]
+                    other += values[child][1 - player][positions]
+                    parents_left[child] -= 1
+                    if parents_left[child] == 0:
+                        values[child] = None
+                    continue
+                # the player's values sum over the opponent's reach and the other way round
+                both = np.concatenate([group_reach[:, 1 - player], group_reach[:, player] * strategy[:, i]])
+                sums = self.compatible_reach(both) if terminal == FOLD else self.showdown_reach(both)
+                own[i] = sums[:node_num] * payoff[:, player, None]
+                other += sums[node_num:] * payoff[:, 1 - player, None]
+            node_value = own[0] * strategy[:, 0]
+            for i in range(1, len(actions)):
+                node_value += own[i] * strategy[:, i]
+            values[group] = [node_value, other] if player == 0 else [other, node_value]
+            # hand chance (reach of the root) weights the regrets of each hand
+            regrets = (own.sum(axis=1) - node_value.sum(axis=0)) * (1.0 / hand_num)
+            strategy_sums = group_reach[:, player].sum(axis=0)[:, None] * strategy
+            self.update_rows(rows, valid, self.street_keys[street][1], regrets, strategy_sums)
+        return [player_values[0] for player_values in values[0]]
+
+    # sums the (actions x hands) regrets and (hands x actions) strategy sums of the hands sharing
+    # a key into its row; a group's rows are its own, so the strategies of the other groups
+    # (computed at the start of the iteration) are not affected
+    def update_rows(self, rows, valid, inverse, regrets, strategy_sums):
+        table = self.node_table
+        key_regrets = np.stack([np.bincount(inverse, weights=regrets[i], minlength=len(rows)) for i in range(len(valid))], axis=1)
+        key_strategy_sums = np.stack([np.bincount(inverse, weights=strategy_sums[:, i], minlength=len(rows))
+                                      for i in range(len(valid))], axis=1)
+        cells = np.ix_(rows, valid)
+        updated = table.regret_sum[cells] + self.regret_weight * key_regrets
+        if self.floor_regrets:
+            np.maximum(updated, 0.0, out=updated)
+        table.regret_sum[cells] = updated
+        table.strategy_sum[cells] += self.strategy_weight * key_strategy_sums
+
+# python vector_cfr.py [options], run from this directory
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the MCCFR strategy with public chance sampling vector CFR")
+    parser.add_argument("--update-rule", choices=UPDATE_RULES, default="vanilla")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--checkpoint-dir", default="vector_cfr_checkpoints")
+    parser.add_argument("--checkpoint-interval", type=int, default=100)
+    parser.add_argument("--abstraction", choices=CARD_ABSTRACTIONS, default="buckets")
+    parser.add_argument("--telemetry", default=None, help="append training telemetry to this .jsonl or .csv file")
+    parser.add_argument("--eval-deals", type=int, default=0, help="exploitability deals at every checkpoint, 0 to skip")
+    args = parser.parse_args()
+    telemetry = TelemetrySink(args.telemetry, fields=TELEMETRY_FIELDS) if args.telemetry else None
+    trainer = VectorCFRTrainer(checkpoint_dir=args.checkpoint_dir, update_rule=args.update_rule, abstraction=args.abstraction,
+                               telemetry=telemetry)
+    trainer.train(target_i=args.iterations, checkpoint_interval=args.checkpoint_interval, log_interval=1, eval_deals=args.eval_deals)
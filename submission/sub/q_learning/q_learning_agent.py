@@ -19,10 +19,36 @@ class QLearnPlayer(BasePokerPlayer):
         action: action ("fold", "call", or "raise") possessing the maximal q_value for the given
         state and action
     """
-    # identify the state and action spaces and retrieve the q-value table
+    return self.declare_actions_batch([(valid_actions, hole_card, round_state)])[0]
+
+  def declare_actions_batch(self, observations):
+    """
+    Batched version of declare_action used when several tables are played in lock-step.
+    The q-value table is loaded once for the whole batch instead of once per decision.
+
+    Arguments:
+        observations: list of (valid_actions, hole_card, round_state) tuples, one per pending decision
+
+    Returns:
+        actions: list with the selected action for each observation, in the same order
+    """
+    q_values = get_q_table()
+    return [self.select_action(q_values, *observation) for observation in observations]
+
+  def select_action(self, q_values, valid_actions, hole_card, round_state):
+    """
+    Selects the action with the maximal q_value for a single decision, breaking ties at random.
+
+    Arguments:
+        q_values: the q-value table loaded by get_q_table
+        valid_actions, hole_card, round_state: same as declare_action
+
+    Returns:
+        action: action ("fold", "call", or "raise") possessing the maximal q_value
+    """
+    # identify the state and action spaces
     state = extract_state(self, hole_card, round_state)
     possible_actions = [a["action"] for a in valid_actions]
-    q_values = get_q_table()
 
     # isolate the q_values for each action and then randomly select one of the actions with the max q value
     q_vals = q_values.get(state, {})
@@ -3,7 +3,9 @@ from pypokerengine.players import BasePokerPlayer
 from sub.q_learning.q_learning_helpers import extract_state, get_q_table
 from randomplayer import RandomPlayer
 from sub.q_learning.q_learning_agent import QLearnPlayer
+from sub.telemetry import TelemetrySink, rss_bytes
 import random
+import time
 import pickle
 import matplotlib.pyplot as plt
 
@@ -178,7 +180,7 @@ def run_training_game(num_rounds=500):
 
     return final_wallets, reward
 
-def run_training(total_games=10000, rounds_per_game=500):
+def run_training(total_games=10000, rounds_per_game=500, telemetry=None):
     """
     Training function that repetitively runs a specified number of games to allow for the agent to receive
     sufficient training. Identifies the winner for the current game, and provides status for ongoing training, before
@@ -189,13 +191,16 @@ def run_training(total_games=10000, rounds_per_game=500):
     Arguments:
         total_games: the specified size of the training
         rounds_per_game: the specified number of rounds per game
+        telemetry: optional TelemetrySink receiving one "game" record per game (reward, win rate, speed, memory)
     """
     global q_values, win_counts, total_rewards
     for game in range(total_games):
 
         # give command line game updates for visibility and then identify the winner of each game
         print(f"\nTraining Game {game + 1}/{total_games}")
+        game_start = time.time()
         final_stacks, reward = run_training_game(num_rounds=rounds_per_game)
+        game_seconds = time.time() - game_start
 
         total_rewards += reward
         cumulative_rewards.append(total_rewards)
@@ -216,6 +221,16 @@ def run_training(total_games=10000, rounds_per_game=500):
         print(f"Winner: {winner[0]} with stack {winner[1]}")
         for name, stack in sorted_stacks:
             print(f" - {name}: {stack}")
+
+        # win_rate is only set on the last game of each 100 game block
+        if telemetry is not None:
+            telemetry.record("game", game=game + 1, reward=reward, cumulative_reward=total_rewards, epsilon=epsilon,
+                             games_per_second=1 / max(game_seconds, 1e-9), rounds_per_second=rounds_per_game / max(game_seconds, 1e-9),
+                             q_states=len(q_values), rss_bytes=rss_bytes(),
+                             win_rate=win_percentages[-1] if (game + 1) % 100 == 0 else None)
+
+    if telemetry is not None:
+        telemetry.flush()
     
     # generate the plot showing the cumulative reward over training
     plt.figure(figsize=(12, 8))
@@ -248,7 +263,7 @@ if __name__ == "__main__":
     """
     Call the training and then after performing the training, uses pickle to save the q_values for later use.
     """
-    run_training()
+    run_training(telemetry=TelemetrySink("q_learning_telemetry.jsonl"))
 
     with open("q_values.pkl", "wb") as f:
         pickle.dump(q_values, f)
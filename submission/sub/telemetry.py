@@ -0,0 +1,75 @@
+import os
+import csv
+import json
+import time
+
+# training telemetry: one record per log interval, appended to a .jsonl or .csv file.
+# Records are buffered and written every flush_records records or flush_seconds seconds,
+# so a long unattended run can be followed with tail -f without slowing the training loop
+FORMATS = ["jsonl", "csv"]
+
+class TelemetrySink:
+    def __init__(self, path, fields=None, fmt=None, flush_records=100, flush_seconds=10.0):
+        fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown telemetry format {fmt}, expected one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        # csv columns; unknown fields of later records are dropped, missing ones left empty
+        self.fields = list(fields) if fields else None
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.last_flush = time.time()
+        self.start_time = time.time()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def record(self, event, **values):
+        now = time.time()
+        self.buffer.append(dict(time=now, elapsed=now - self.start_time, event=event, **values))
+        if len(self.buffer) >= self.flush_records or now - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        if self.fmt == "jsonl":
+            with open(self.path, 'a') as f:
+                f.write("".join(json.dumps(record, default=_to_json) + "\n" for record in records))
+            return
+        if self.fields is None:
+            self.fields = list(records[0])
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            writer.writerows(records)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# numpy scalars and the like
+def _to_json(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+# current resident set size in bytes (peak size where /proc is not available)
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,38 @@
+import os
+import sys
+import random
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [os.path.join(ROOT, "submission", "sub", "mccfr"), os.path.join(ROOT, "submission"), ROOT]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from mccfr_trainer import MCCFRTrainer
+
+def _trainer(checkpoint_dir, update_rule):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return MCCFRTrainer(checkpoint_dir=checkpoint_dir, update_rule=update_rule)
+
+def _sorted_table(table):
+    order = np.argsort(table.keys)
+    size = len(table)
+    return np.array(table.keys)[order], table.regret_sum[:size][order], table.strategy_sum[:size][order]
+
+@pytest.mark.parametrize("update_rule", ["vanilla", "dcfr"])
+def test_resume_from_delta_checkpoint(tmp_path, update_rule):
+    random.seed(0)
+    trainer = _trainer(str(tmp_path), update_rule)
+    with contextlib.redirect_stdout(io.StringIO()):
+        trainer.train(target_i=60, checkpoint_interval=20, log_interval=1000, full_checkpoint_every=100)
+    resumed = _trainer(str(tmp_path), update_rule)
+    assert resumed.start_iteration == 60
+    keys, regrets, strategies = _sorted_table(trainer.node_table)
+    resumed_keys, resumed_regrets, resumed_strategies = _sorted_table(resumed.node_table)
+    np.testing.assert_array_equal(keys, resumed_keys)
+    np.testing.assert_allclose(resumed_regrets, regrets, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(resumed_strategies, strategies, rtol=0, atol=1e-9)